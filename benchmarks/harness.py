@@ -0,0 +1,48 @@
+"""
+Shared helpers for the benchmarks: isolated worker processes, peak memory and the commit under test.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def current_commit():
+    """Return the commit the benchmark runs on, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_worker(module, args, env=None):
+    """
+    Runs one measurement in a fresh process, so peak RSS and the process-wide caches, stores and
+    rate limiters start from scratch, and returns the JSON object the worker printed last.
+    The worker gets its own result store, response cache and export directory.
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        worker_env = dict(os.environ)
+        worker_env.update({
+            "LLMEVAL_RESULTS_PATH": os.path.join(scratch, "results.sqlite"),
+            "LLMEVAL_CACHE_PATH": os.path.join(scratch, "responses.sqlite"),
+            "LLMEVAL_EXPORT_DIR": os.path.join(scratch, "exports"),
+        })
+        worker_env.update(env or {})
+        completed = subprocess.run([sys.executable, "-m", module, "--worker"] + [str(arg) for arg in args],
+                                   cwd=REPO_ROOT, env=worker_env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{module} worker failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
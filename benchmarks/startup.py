@@ -0,0 +1,142 @@
+"""
+Cold start of the pages and of the first evaluation of a process.
+
+    python -m benchmarks.startup --repeat 3
+
+Every measurement runs in a fresh process, so nothing is imported or built yet, and the fastest of
+--repeat processes is reported:
+
+- the first script run of each page through Streamlit's AppTest (Streamlit itself is already imported,
+  as it is in the server), and which heavy dependencies the page imported itself rather than leaving them
+  to the background warm-up (llmeval.pipeline.warm_up)
+- importing llmeval.pipeline, then the first and the second evaluation of a task against the mock stub
+  with no simulated latency, so only the app's own work is timed
+- the first evaluation after the LLM evaluator page has been loaded and left idle for --idle seconds,
+  as when an analyst opens the page and types a task
+
+--json prints one JSON object per measurement, tagged with the commit, so runs can be compared across commits.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from benchmarks.harness import REPO_ROOT, current_commit, run_worker
+
+PAGES = {"home": "Home.py", "human": os.path.join("pages", "human_evaluator.py"),
+         "llm": os.path.join("pages", "llm_evaluator.py")}
+HEAVY_MODULES = ["autogen", "openai", "pandas", "numpy"]
+TASKS = ["Benchmark task: scaffold erection on level 3", "Benchmark task: trench excavation next to a road"]
+
+
+class ImportRecorder:
+    """Import hook that records the heavy modules imported outside the warm-up thread."""
+
+    def __init__(self):
+        self.imported = []
+
+    def find_spec(self, name, path=None, target=None):
+        if name in HEAVY_MODULES and threading.current_thread().name != "llmeval-warm-up":
+            self.imported.append(name)
+        # Leave the import to the regular finders
+        return None
+
+
+def load_page(name):
+    """Runs a page once and returns its run time in seconds and the heavy modules it imported."""
+    from streamlit.testing.v1 import AppTest
+
+    page = AppTest.from_file(os.path.join(REPO_ROOT, PAGES[name]), default_timeout=600)
+    recorder = ImportRecorder()
+    sys.meta_path.insert(0, recorder)
+    start = time.perf_counter()
+    page.run()
+    seconds = time.perf_counter() - start
+    sys.meta_path.remove(recorder)
+    if page.exception:
+        raise RuntimeError(f"the page raised: {page.exception[0].value}")
+    return seconds, recorder.imported
+
+
+def evaluate(task):
+    """Evaluates a task without the response cache and returns how long it took in seconds."""
+    from llmeval.cache import CACHE_BYPASS
+    from llmeval.pipeline import run_jsa_evaluation
+
+    start = time.perf_counter()
+    # autogen prints every group chat message
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_jsa_evaluation(task, "sk-benchmark", CACHE_BYPASS)
+    return time.perf_counter() - start
+
+
+def measure(target, idle):
+    """Returns the measurements of one target in a fresh process."""
+    if target in PAGES:
+        seconds, loaded = load_page(target)
+        return {"page_seconds": seconds, "loaded": loaded}
+    if target == "evaluation":
+        start = time.perf_counter()
+        import llmeval.pipeline  # noqa: F401
+        import_seconds = time.perf_counter() - start
+        return {"import_seconds": import_seconds, "first_evaluation_seconds": evaluate(TASKS[0]),
+                "second_evaluation_seconds": evaluate(TASKS[1])}
+    # The first evaluation after the LLM evaluator page was loaded and left idle
+    page_seconds, _ = load_page("llm")
+    time.sleep(idle)
+    return {"page_seconds": page_seconds, "first_evaluation_seconds": evaluate(TASKS[0])}
+
+
+def fastest(records):
+    """Return the fastest value of every timing over the records of repeated processes."""
+    best = dict(records[0])
+    for record in records[1:]:
+        for key, value in record.items():
+            if key.endswith("_seconds"):
+                best[key] = min(best[key], value)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the cold start of the pages and of the first evaluation.")
+    parser.add_argument("--targets", nargs="+", choices=list(PAGES) + ["evaluation", "evaluation_after_page"],
+                        default=list(PAGES) + ["evaluation", "evaluation_after_page"], help="what to measure")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh processes per target; the fastest is reported")
+    parser.add_argument("--idle", type=float, default=3.0,
+                        help="seconds the page is left idle before the first evaluation in evaluation_after_page")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per target instead of a table")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(measure(args.targets[0], args.idle)))
+        return 0
+
+    from llmeval.mock import StubBackend, start_server
+
+    server = start_server(StubBackend())
+    env = {"LLMEVAL_BASE_URL": server.base_url, "LLMEVAL_REQUESTS_PER_MINUTE": "1000000",
+           "LLMEVAL_TOKENS_PER_MINUTE": "1000000000"}
+    commit = current_commit()
+    for target in args.targets:
+        record = fastest([run_worker("benchmarks.startup", ["--targets", target, "--idle", args.idle], env)
+                          for _ in range(args.repeat)])
+        if args.json:
+            record.update({"benchmark": "startup", "commit": commit, "target": target, "repeat": args.repeat})
+            print(json.dumps(record))
+        else:
+            timings = ", ".join(f"{key[:-len('_seconds')].replace('_', ' ')} {value * 1000:.0f} ms"
+                                for key, value in record.items() if key.endswith("_seconds"))
+            loaded = f"; imported: {', '.join(record['loaded']) or 'none'}" if "loaded" in record else ""
+            print(f"{target:<22} {timings}{loaded}")
+        sys.stdout.flush()
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Micro-benchmark for the Markdown table parser used by display_response.
+
+    python -m benchmarks.table_parser --sizes 10 100 1000
+
+Builds synthetic ReporterAgent-style reports with the given number of table rows and compares
+the regex-based extractor the app used before with the single-pass parser in utils.
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from io import StringIO
+
+import pandas as pd
+
+from utils import parse_markdown_segments
+
+LEGACY_TABLE_PATTERN = re.compile(r'(\|.+?\|(?:\n\|[-:]+)+\n(?:\|.*?\|(?:\n|$))+)', re.DOTALL)
+
+
+def legacy_extract_tables(markdown_text):
+    """The regex and pd.read_csv extractor the app used before the single-pass parser."""
+    tables = []
+    for match in LEGACY_TABLE_PATTERN.findall(markdown_text):
+        table = pd.read_csv(StringIO(match), sep='|').dropna(axis=1, how='all').dropna(axis=0, how='all')
+        tables.append(table)
+    return tables
+
+
+def synthetic_report(rows, rows_per_table=20):
+    """
+    Returns a JSA report with the given number of table rows, split into tables with prose between them.
+    """
+    parts = ["# Job Safety Analysis Report\n\nScope of the analysis and the site conditions.\n"]
+    for start in range(0, rows, rows_per_table):
+        parts.append(f"## Job steps {start + 1}-{min(rows, start + rows_per_table)}\n\n"
+                     "The hazards below were identified by the safety inspector.\n")
+        lines = ["| Job Step | Hazard | Risk Level | Control Measures |", "|---|---|---|---|"]
+        for row in range(start, min(rows, start + rows_per_table)):
+            lines.append(f"| Step {row + 1} | Fall from height while working on scaffold | High | "
+                         f"Use harness, inspect scaffold, barricade area below (ref {row}) |")
+        parts.append("\n".join(lines) + "\n")
+    parts.append("## Recommendations\n\nReview the analysis before every shift. TERMINATE")
+    return "\n".join(parts)
+
+
+def best_of(function, argument, repeat):
+    """Return the fastest of repeat timed calls, in seconds, and the result of the last call."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(argument)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the legacy regex table extractor with the single-pass parser.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 300, 1000],
+                        help="number of table rows in each synthetic report")
+    parser.add_argument("--repeat", type=int, default=3, help="timed calls per size; the fastest is reported")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per size instead of a table")
+    args = parser.parse_args(argv)
+
+    if not args.json:
+        print(f"{'rows':>6} {'chars':>9} {'legacy (ms)':>12} {'single-pass (ms)':>17} {'speedup':>8} "
+              f"{'tables found (legacy/single-pass)':>34}")
+    for rows in args.sizes:
+        report = synthetic_report(rows)
+        legacy, legacy_tables = best_of(legacy_extract_tables, report, args.repeat)
+        single_pass, segments = best_of(parse_markdown_segments, report, args.repeat)
+        # The legacy pattern only accepts single-column delimiter rows, so it also misses most tables
+        tables = sum(1 for kind, _ in segments if kind == "table")
+        if args.json:
+            print(json.dumps({"rows": rows, "chars": len(report), "legacy_seconds": legacy,
+                              "single_pass_seconds": single_pass, "legacy_tables": len(legacy_tables),
+                              "single_pass_tables": tables}))
+        else:
+            print(f"{rows:>6} {len(report):>9} {legacy * 1000:>12.2f} {single_pass * 1000:>17.2f} "
+                  f"{legacy / single_pass:>7.1f}x {len(legacy_tables):>16}/{tables}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
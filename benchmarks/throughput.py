@@ -0,0 +1,117 @@
+"""
+End-to-end evaluation throughput against a simulated-latency backend.
+
+    python -m benchmarks.throughput --sizes 1 10 100 1000 --concurrency 16 --latency lognormal:0.2:0.5
+
+Each batch size runs in a fresh process through evaluate_tasks (the path of the LLM evaluator and the
+batch CLI) with a result store, against the llmeval.mock stub server. It reports throughput, p50/p95
+task latency, model calls, prompt tokens and peak RSS; --context pruned compares the pruned group chat history. --json prints one JSON object per size, tagged with the commit,
+so runs can be compared across commits.
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+
+from benchmarks.harness import current_commit, peak_rss_mb, run_worker
+
+
+def measure(size, concurrency, speaker_mode, stream, context_mode):
+    """Evaluates size synthetic tasks and returns the measurements of the batch."""
+    import numpy as np
+
+    from llmeval.cache import CACHE_BYPASS
+    from llmeval.pipeline import evaluate_tasks
+    from llmeval.store import get_store
+
+    store = get_store()
+    run_id = store.new_run()
+    tasks = ((index, f"Benchmark task {index}: scaffold erection on level {index % 12}") for index in range(size))
+    on_event = (lambda index, kind, source, text: None) if stream else None
+
+    latencies = []
+    failed = 0
+    start = time.perf_counter()
+    # autogen prints every group chat message
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _, _, result, error in evaluate_tasks(tasks, "sk-benchmark", concurrency, CACHE_BYPASS, store=store,
+                                                  run_id=run_id, on_event=on_event, speaker_mode=speaker_mode,
+                                                  context_mode=context_mode):
+            if error is None:
+                latencies.append(result["Total Seconds"])
+            else:
+                failed += 1
+    wall = time.perf_counter() - start
+
+    calls = list(store.iter_calls([run_id]))
+    return {
+        "tasks": size,
+        "failed": failed,
+        "wall_seconds": wall,
+        "tasks_per_second": size / wall,
+        "task_p50_seconds": float(np.percentile(latencies, 50)) if latencies else None,
+        "task_p95_seconds": float(np.percentile(latencies, 95)) if latencies else None,
+        "model_calls": len(calls),
+        "calls_per_second": len(calls) / wall,
+        "prompt_tokens": sum(call["prompt_tokens"] or 0 for call in calls),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure evaluation throughput against a simulated-latency backend.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000], help="tasks per batch")
+    parser.add_argument("--concurrency", type=int, default=16, help="tasks evaluated in parallel")
+    parser.add_argument("--speakers", choices=["auto", "fsm", "fixed"], default="auto",
+                        help="Dragonshield speaker selection")
+    parser.add_argument("--latency", default="lognormal:0.2:0.5",
+                        help="simulated time to first token per call (see llmeval.mock)")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="seconds between streamed chunks")
+    parser.add_argument("--context", choices=["full", "pruned"], default="full",
+                        help="Dragonshield group chat history per call")
+    parser.add_argument("--stream", action="store_true", help="stream advisor and judge output, as the pages do")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per size instead of a table")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(measure(args.sizes[0], args.concurrency, args.speakers, args.stream, args.context)))
+        return 0
+
+    from llmeval.mock import StubBackend, start_server
+
+    server = start_server(StubBackend(), latency=args.latency, chunk_delay=args.chunk_delay)
+    # The simulated backend has no rate limit to respect
+    env = {"LLMEVAL_BASE_URL": server.base_url, "LLMEVAL_REQUESTS_PER_MINUTE": "1000000",
+           "LLMEVAL_TOKENS_PER_MINUTE": "1000000000"}
+    commit = current_commit()
+
+    if not args.json:
+        print(f"{'tasks':>6} {'wall (s)':>9} {'tasks/s':>8} {'p50 (s)':>8} {'p95 (s)':>8} {'calls':>7} "
+              f"{'calls/s':>8} {'prompt tokens':>14} {'peak RSS (MiB)':>15} {'failed':>7}")
+    for size in args.sizes:
+        worker_args = ["--sizes", size, "--concurrency", args.concurrency, "--speakers", args.speakers,
+                       "--context", args.context]
+        if args.stream:
+            worker_args.append("--stream")
+        record = run_worker("benchmarks.throughput", worker_args, env)
+        if args.json:
+            record.update({"benchmark": "throughput", "commit": commit, "concurrency": args.concurrency,
+                           "speakers": args.speakers, "context": args.context, "latency": args.latency,
+                           "stream": args.stream})
+            print(json.dumps(record))
+        else:
+            print(f"{size:>6} {record['wall_seconds']:>9.2f} {record['tasks_per_second']:>8.2f} "
+                  f"{record['task_p50_seconds'] or 0:>8.2f} {record['task_p95_seconds'] or 0:>8.2f} "
+                  f"{record['model_calls']:>7} {record['calls_per_second']:>8.1f} {record['prompt_tokens']:>14} "
+                  f"{record['peak_rss_mb']:>15.1f} "
+                  f"{record['failed']:>7}")
+        sys.stdout.flush()
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Timings of the Streamlit-side hot paths on large synthetic result sets.
+
+    python -m benchmarks.ui_hot_paths --sizes 100 1000 --rows 20
+
+Each size runs in a fresh process with a result store holding that many synthetic results, whose
+reports have --rows table rows. It times, fastest of --repeat:
+
+- table extraction over every report, with an empty and with a warm segment cache
+- display_response over every report (outside a Streamlit session, so only the app's own work counts)
+- building the summary table and its breakdowns from the store
+- the Excel, CSV and Parquet exports
+- a full rerun of the LLM evaluator page showing the results, first and repeated, which includes the
+  detailed results loop
+
+--json prints one JSON object per size, tagged with the commit, so runs can be compared across commits.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import REPO_ROOT, current_commit, peak_rss_mb, run_worker
+from benchmarks.table_parser import synthetic_report
+
+TIMINGS = ["extract_tables_cold", "extract_tables_warm", "display_response", "summary", "export_xlsx",
+           "export_csv", "export_parquet", "page_rerun_first", "page_rerun_repeat"]
+
+
+def synthetic_result(index, rows):
+    """Returns a result shaped like those of run_jsa_evaluation, with a report of the given number of table rows."""
+    winners = ["Dragonshield", "JSA Advisor", "Tie"]
+    first, second = winners[index % 3], winners[(index // 3) % 3]
+    report = synthetic_report(rows).replace("Job Safety Analysis Report", f"Job Safety Analysis Report {index}")
+    return {
+        "Task": f"Benchmark task {index}: scaffold erection on level {index % 12}",
+        "Dragonshield Response": report,
+        "JSA Advisor Response": report.replace("Fall from height", "Struck by falling object"),
+        "Judge Response 1": f"Response A is better structured. [[{'A' if first == 'JSA Advisor' else 'B'}]]",
+        "Judge Response 2": f"Response B is better structured. [[{'B' if second == 'JSA Advisor' else 'A'}]]",
+        "Run 1 Winner": first,
+        "Run 2 Winner": second,
+        "Winner": "Tie or inconclusive",
+        "Dragonshield Time": "41.20s",
+        "JSA Advisor Time": "12.30s",
+        "Judge Time": "9.80s",
+        "Total Time": "51.00s",
+        "Dragonshield Seconds": 41.2,
+        "JSA Advisor Seconds": 12.3,
+        "Judge Seconds": 9.8,
+        "Total Seconds": 51.0,
+    }
+
+
+def fastest(function, repeat, setup=None):
+    """Return the fastest of repeat timed calls in seconds; setup runs untimed before each call."""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure(size, rows, repeat):
+    """Builds a store of size synthetic results and returns the timings of every hot path in seconds."""
+    from streamlit.testing.v1 import AppTest
+
+    from llmeval.export import export_results
+    from llmeval.store import get_store
+    from llmeval.summary import comparison_breakdown, results_frame, timing_by_winner, win_counts
+    from utils import display_response, extract_segments, extract_tables
+
+    store = get_store()
+    run_id = store.new_run()
+    for index in range(size):
+        store.add_task(run_id, index, f"Benchmark task {index}")
+        store.put_result(run_id, index, synthetic_result(index, rows))
+    run_ids = [run_id]
+    reports = [response for result in store.iter_results(run_ids)
+               for response in (result["Dragonshield Response"], result["JSA Advisor Response"])]
+
+    def extract_all():
+        for report in reports:
+            extract_tables(report)
+
+    def display_all():
+        for report in reports:
+            display_response(report)
+
+    def summary():
+        frame = results_frame(store.iter_results(run_ids))
+        win_counts(frame)
+        comparison_breakdown(frame)
+        timing_by_winner(frame)
+
+    def export(fmt):
+        # A fresh directory every time, so the export is written rather than reused
+        return lambda: export_results(store, run_ids, fmt, export_dir=tempfile.mkdtemp())
+
+    page = AppTest.from_file(os.path.join(REPO_ROOT, "pages", "llm_evaluator.py"), default_timeout=3600)
+    page.session_state["run_ids"] = run_ids
+
+    timings = {
+        "extract_tables_cold": fastest(extract_all, repeat, setup=extract_segments.clear),
+        "extract_tables_warm": fastest(extract_all, repeat, setup=extract_all),
+        "display_response": fastest(display_all, repeat),
+        "summary": fastest(summary, repeat),
+        "export_xlsx": fastest(export("xlsx"), repeat),
+        "export_csv": fastest(export("csv"), repeat),
+    }
+    try:
+        import pyarrow  # noqa: F401
+        timings["export_parquet"] = fastest(export("parquet"), repeat)
+    except ImportError:
+        timings["export_parquet"] = None
+    start = time.perf_counter()
+    page.run()
+    timings["page_rerun_first"] = time.perf_counter() - start
+    timings["page_rerun_repeat"] = fastest(page.run, repeat)
+    if page.exception:
+        raise RuntimeError(f"the page raised: {page.exception[0].value}")
+
+    return dict({"results": size, "rows": rows, "peak_rss_mb": peak_rss_mb()},
+                **{f"{name}_seconds": seconds for name, seconds in timings.items()})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the Streamlit-side hot paths on large synthetic result sets.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000], help="results in each result set")
+    parser.add_argument("--rows", type=int, default=20, help="table rows in each synthetic report")
+    parser.add_argument("--repeat", type=int, default=3, help="timed calls per path; the fastest is reported")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per size instead of a table")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(measure(args.sizes[0], args.rows, args.repeat)))
+        return 0
+
+    commit = current_commit()
+    for size in args.sizes:
+        record = run_worker("benchmarks.ui_hot_paths", ["--sizes", size, "--rows", args.rows, "--repeat", args.repeat])
+        if args.json:
+            record.update({"benchmark": "ui_hot_paths", "commit": commit, "repeat": args.repeat})
+            print(json.dumps(record))
+        else:
+            print(f"{size} results, {args.rows} table rows per report, peak RSS {record['peak_rss_mb']:.1f} MiB")
+            for name in TIMINGS:
+                seconds = record[f"{name}_seconds"]
+                print(f"  {name:<22} {'n/a' if seconds is None else f'{seconds * 1000:10.1f} ms'}")
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
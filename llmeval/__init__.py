@@ -0,0 +1 @@
+"""Evaluation pipeline shared by the Streamlit pages."""
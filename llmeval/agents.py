@@ -0,0 +1,261 @@
+"""
+The Dragonshield agents and the pool they are reused from.
+This module imports autogen, so llmeval.pipeline imports it lazily, on the first Dragonshield chat.
+"""
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+
+import autogen
+
+from llmeval.cache import CACHE_USE
+from llmeval.context import CONTEXT_FULL, CONTEXT_PRUNED, DEFAULT_CONTEXT_BUDGET, selector_context, visible_context
+from llmeval.llm import llm_config, register_agents
+from llmeval.pipeline import (
+    DEFAULT_MAX_FEEDBACK_ROUNDS,
+    MAX_ROUND,
+    SPEAKER_FLOW,
+    SPEAKERS_AUTO,
+    SPEAKERS_FIXED,
+    is_final_report,
+)
+from llmeval.prompts import (
+    FEEDBACKER_PROMPT,
+    MANAGER_PROMPT,
+    PROJECT_MANAGER_PROMPT,
+    REPORTER_PROMPT,
+    RISK_ASSESSMENT_PROMPT,
+    RISK_MANAGEMENT_PROMPT,
+    SAFETY_INSPECTOR_PROMPT,
+)
+
+# Idle teams kept per configuration; more are built when more chats run at once
+MAX_IDLE_TEAMS = 16
+
+
+def speaker_transitions(agents, speaker_mode):
+    """
+    Returns the allowed speaker transitions for a speaker mode, or None to let the LLM choose every speaker.
+    Only the Feedbacker has more than one successor, so the LLM selector is asked only in the feedback loop;
+    the Reporter has none, so the chat ends once it has reported.
+    """
+    if speaker_mode == SPEAKERS_AUTO:
+        return None
+    by_name = {agent.name: agent for agent in agents}
+    transitions = {by_name[name]: [by_name[successor] for successor in successors]
+                   for name, successors in SPEAKER_FLOW.items()}
+    if speaker_mode == SPEAKERS_FIXED:
+        transitions[by_name["FeedbackerAgent"]] = [by_name["RiskManagementAgent"]]
+    return transitions
+
+
+@dataclass
+class DragonshieldGroupChat(autogen.GroupChat):
+    """
+    GroupChat that counts its speaker selections and how many of them needed an LLM call.
+    It also keeps to a round budget: the RiskAssessment/Feedbacker loop is capped at max_feedback_rounds
+    Feedbacker turns and is cut short when only RiskManagement and the Reporter still fit in max_round,
+    and the last round always goes to the Reporter.
+    With the pruned context mode, the LLM speaker selection only sees a summarized history (see llmeval.context).
+    """
+
+    max_feedback_rounds: int = DEFAULT_MAX_FEEDBACK_ROUNDS
+    context_mode: str = CONTEXT_FULL
+    context_budget: int = DEFAULT_CONTEXT_BUDGET
+
+    def budgeted_speaker(self, last_speaker):
+        """Return the speaker the round budget forces next, or None."""
+        # Every round after the current one needs one more speaker
+        remaining = self.max_round - len(self.messages)
+        if remaining <= 1 and last_speaker.name != "ReporterAgent":
+            return self.agent_by_name("ReporterAgent")
+        if last_speaker.name == "FeedbackerAgent":
+            feedback_rounds = sum(1 for message in self.messages if message.get("name") == "FeedbackerAgent")
+            if remaining <= 2 or feedback_rounds >= self.max_feedback_rounds:
+                return self.agent_by_name("RiskManagementAgent")
+        return None
+
+    def __post_init__(self):
+        super().__post_init__()
+        # A dict, because the manager runs the chat on a shallow copy of its GroupChat
+        self.selection_counts = {"speaker_selections": 0, "selector_calls": 0}
+
+    def _prepare_and_select_agents(self, last_speaker):
+        budgeted = self.budgeted_speaker(last_speaker)
+        if budgeted is not None:
+            self.selection_counts["speaker_selections"] += 1
+            return budgeted, self.agents, None
+        selected_agent, agents, messages = super()._prepare_and_select_agents(last_speaker)
+        self.selection_counts["speaker_selections"] += 1
+        # Without a selected agent the manager asks the LLM to choose
+        if selected_agent is None:
+            self.selection_counts["selector_calls"] += 1
+            if self.context_mode == CONTEXT_PRUNED:
+                messages = selector_context(messages, self.context_budget)
+        return selected_agent, agents, messages
+
+    def reset(self):
+        super().reset()
+        # In place, because the manager's copy of the GroupChat shares the dict
+        self.selection_counts.update(speaker_selections=0, selector_calls=0)
+
+
+def build_dragonshield(api_key, cache_mode=CACHE_USE, speaker_mode=SPEAKERS_AUTO,
+                       max_feedback_rounds=DEFAULT_MAX_FEEDBACK_ROUNDS, context_mode=CONTEXT_FULL,
+                       context_budget=DEFAULT_CONTEXT_BUDGET):
+    """
+    Creates the Dragonshield agents and returns the admin proxy and the group chat manager.
+    With the pruned context mode, every agent replies to only the part of the history it needs
+    (see llmeval.context.visible_context).
+    """
+    # Common LLM configuration
+    model_config = llm_config(api_key)
+
+    # Initialize agents with the exact prompts provided
+    user_proxy = autogen.UserProxyAgent(
+        name="Admin",
+        system_message="A human admin.",
+        code_execution_config=False,
+        human_input_mode="TERMINATE"
+    )
+
+    project_manager_agent = autogen.AssistantAgent(
+        name="ProjectManagerAgent",
+        llm_config=model_config,
+        system_message=PROJECT_MANAGER_PROMPT,
+    )
+
+    safety_inspector_agent = autogen.AssistantAgent(
+        name="SafetyInspectorAgent",
+        llm_config=model_config,
+        system_message=SAFETY_INSPECTOR_PROMPT,
+    )
+
+    risk_assessment_agent = autogen.AssistantAgent(
+        name="RiskAssessmentAgent",
+        llm_config=model_config,
+        system_message=RISK_ASSESSMENT_PROMPT,
+    )
+
+    feedbacker_agent = autogen.AssistantAgent(
+        name="FeedbackerAgent",
+        llm_config=model_config,
+        system_message=FEEDBACKER_PROMPT,
+    )
+
+    risk_management_agent = autogen.AssistantAgent(
+        name="RiskManagementAgent",
+        llm_config=model_config,
+        system_message=RISK_MANAGEMENT_PROMPT,
+    )
+
+    reporter_agent = autogen.AssistantAgent(
+        name="ReporterAgent",
+        llm_config=model_config,
+        system_message=REPORTER_PROMPT,
+    )
+
+    # Setup group chat
+    agents = [user_proxy, project_manager_agent, safety_inspector_agent, risk_assessment_agent,
+              feedbacker_agent, risk_management_agent, reporter_agent]
+    transitions = speaker_transitions(agents, speaker_mode)
+    groupchat = DragonshieldGroupChat(
+        agents=agents,
+        messages=[],
+        max_round=MAX_ROUND,
+        max_feedback_rounds=max_feedback_rounds,
+        context_mode=context_mode,
+        context_budget=context_budget,
+        allowed_or_disallowed_speaker_transitions=transitions,
+        speaker_transitions_type="allowed" if transitions is not None else None,
+        # Repeat speakers are governed by the transitions when there are any
+        allow_repeat_speaker=None if transitions is not None else True,
+    )
+
+    manager = autogen.GroupChatManager(
+        groupchat=groupchat,
+        llm_config=model_config,
+        system_message=MANAGER_PROMPT,
+        is_termination_msg=is_final_report,
+    )
+
+    # Send every agent call, including the manager's speaker selection, through the response cache
+    register_agents(agents + [manager], cache_mode=cache_mode)
+
+    # The hook only changes what the agent replies to, not the history autogen keeps
+    if context_mode == CONTEXT_PRUNED:
+        for agent in agents:
+            if agent.llm_config:
+                agent.register_hook("process_all_messages_before_reply",
+                                    partial(visible_context, agent.name, budget=context_budget))
+
+    return user_proxy, manager
+
+
+def chat_tokens(agents):
+    """Return the prompt and completion tokens of every model call the agents made."""
+    prompt_tokens = completion_tokens = 0
+    for agent in agents:
+        summary = agent.client.total_usage_summary if agent.client is not None else None
+        for usage in (summary or {}).values():
+            if isinstance(usage, dict):
+                prompt_tokens += usage.get("prompt_tokens", 0)
+                completion_tokens += usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+class DragonshieldTeam:
+    """
+    The Dragonshield agents of one configuration, built once and reused for chat after chat.
+    on_message(agent, content) is called for every message of the current chat as soon as its agent has spoken.
+    """
+
+    def __init__(self, api_key, cache_mode=CACHE_USE, speaker_mode=SPEAKERS_AUTO,
+                 max_feedback_rounds=DEFAULT_MAX_FEEDBACK_ROUNDS, context_mode=CONTEXT_FULL,
+                 context_budget=DEFAULT_CONTEXT_BUDGET):
+        self.user_proxy, self.manager = build_dragonshield(api_key, cache_mode, speaker_mode, max_feedback_rounds,
+                                                           context_mode, context_budget)
+        self.on_message = None
+        # Hooks can't be removed, so one hook forwards to whichever on_message the current chat set
+        for agent in self.manager.groupchat.agents:
+            agent.register_hook("process_message_before_send", self._forward)
+
+    def _forward(self, sender, message, recipient, silent):
+        # Report each message when its speaker sends it to the manager, not when the manager relays it
+        if self.on_message is not None and recipient is self.manager:
+            self.on_message(sender.name, message.get("content") if isinstance(message, dict) else message)
+        return message
+
+    def reset(self):
+        """Forget the last chat: histories, speaker selection counts, token usage and on_message."""
+        for agent in self.manager.groupchat.agents + [self.manager]:
+            agent.reset()
+        self.on_message = None
+
+
+_idle_teams = {}
+_idle_teams_lock = threading.Lock()
+
+
+@contextmanager
+def dragonshield_team(api_key, cache_mode=CACHE_USE, speaker_mode=SPEAKERS_AUTO,
+                      max_feedback_rounds=DEFAULT_MAX_FEEDBACK_ROUNDS, context_mode=CONTEXT_FULL,
+                      context_budget=DEFAULT_CONTEXT_BUDGET):
+    """
+    Runs the block with a DragonshieldTeam of this configuration that no other chat is using.
+    Teams are shared by every session and job of the process: an idle one is reused, or a new one is built,
+    and it is reset and put back once the block is done. A team whose chat raised is dropped instead.
+    """
+    key = (api_key, cache_mode, speaker_mode, max_feedback_rounds, context_mode, context_budget)
+    with _idle_teams_lock:
+        idle = _idle_teams.get(key)
+        team = idle.pop() if idle else None
+    if team is None:
+        team = DragonshieldTeam(*key)
+    yield team
+    team.reset()
+    with _idle_teams_lock:
+        idle = _idle_teams.setdefault(key, [])
+        if len(idle) < MAX_IDLE_TEAMS:
+            idle.append(team)
@@ -0,0 +1,160 @@
+"""
+Headless batch evaluation.
+
+    python -m llmeval.batch tasks.jsonl --out results.jsonl --concurrency 8
+
+Each input line is either a JSON object with a "task" field (and an optional "id")
+or a plain JSON string. Each result is appended to the output file as soon as its
+task finishes, so output order follows completion order; "index" is the position of the task
+in the input file.
+
+Every stage is also checkpointed in the result store under a run id. Passing the id of an
+interrupted run with --run-id resumes it: finished tasks are skipped and unfinished ones pick up
+from their first missing stage.
+
+A task that runs out of time (--task-timeout, or the stage deadlines --dragonshield-timeout,
+--advisor-timeout and --judge-timeout) is written with an "Error" and the stage it timed out in;
+resuming the run tries it again.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from llmeval.cache import CACHE_BYPASS, CACHE_REFRESH, CACHE_USE
+from llmeval.context import CONTEXT_FULL, CONTEXT_PRUNED, DEFAULT_CONTEXT_BUDGET
+from llmeval.deadlines import StageTimeout
+from llmeval.llm import latencies
+from llmeval.pipeline import (
+    DEFAULT_DEADLINES,
+    DEFAULT_MAX_FEEDBACK_ROUNDS,
+    JUDGE_COMPACT,
+    JUDGE_VERBOSE,
+    SPEAKERS_AUTO,
+    SPEAKERS_FIXED,
+    SPEAKERS_FSM,
+    evaluate_tasks,
+)
+from llmeval.store import get_store
+
+
+def read_tasks(path):
+    """
+    Yields (id, task) pairs from a JSONL file, one line at a time.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                yield str(line_number), record
+            else:
+                yield str(record.get("id", line_number)), record["task"]
+
+
+def run_batch(input_path, output_path, api_key, concurrency=4, cache_mode=CACHE_USE, run_id=None, log=sys.stderr,
+              speaker_mode=SPEAKERS_AUTO, max_feedback_rounds=DEFAULT_MAX_FEEDBACK_ROUNDS, report_retries=1,
+              judge_mode=JUDGE_VERBOSE, context_mode=CONTEXT_FULL, context_budget=DEFAULT_CONTEXT_BUDGET,
+              deadlines=None, hedge=False):
+    """
+    Evaluates every task in input_path and streams the results to output_path.
+    Returns the number of tasks that completed and the number that failed.
+    A task that timed out is written with the stage and deadline it ran out of.
+    """
+    store = get_store()
+    run_id = store.new_run(run_id)
+    log.write(f"run {run_id}\n")
+    ids = {}
+
+    def tasks():
+        for index, (task_id, task) in enumerate(read_tasks(input_path)):
+            # Tasks finished by an earlier attempt of this run are already in the output file
+            if store.has_result(run_id, index):
+                continue
+            ids[index] = task_id
+            yield index, task
+
+    completed = failed = 0
+    start_time = time.time()
+    with open(output_path, "a", encoding="utf-8") as out:
+        evaluations = evaluate_tasks(tasks(), api_key, concurrency, cache_mode, store=store, run_id=run_id,
+                                     speaker_mode=speaker_mode, max_feedback_rounds=max_feedback_rounds,
+                                     report_retries=report_retries, judge_mode=judge_mode,
+                                     context_mode=context_mode, context_budget=context_budget,
+                                     deadlines=deadlines, hedge=hedge)
+        for index, task, result, error in evaluations:
+            record = {"id": ids.pop(index), "index": index, "run_id": run_id}
+            if error is None:
+                record.update(result)
+                completed += 1
+                log.write(f"[{completed + failed}] {record['id']}: {result['Winner']} in {result['Total Time']}\n")
+            else:
+                record.update({"Task": task, "Error": str(error)})
+                if isinstance(error, StageTimeout):
+                    record.update({"Timed Out Stage": error.stage, "Deadline": error.deadline,
+                                   "Timeout Seconds": error.seconds})
+                failed += 1
+                log.write(f"[{completed + failed}] {record['id']}: failed: {error}\n")
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+    log.write(f"{completed} completed, {failed} failed in {time.time() - start_time:.2f}s\n")
+    for agent, counts in latencies.hedges.items():
+        log.write(f"{agent}: {counts['sent']} hedged requests, {counts['won']} answered first\n")
+    return completed, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Dragonshield vs JSA Advisor evaluation over a JSONL task file.")
+    parser.add_argument("tasks", help="JSONL file with one task per line")
+    parser.add_argument("--out", required=True, help="JSONL file the results are appended to")
+    parser.add_argument("--concurrency", type=int, default=4, help="number of tasks evaluated in parallel")
+    parser.add_argument("--cache", choices=[CACHE_USE, CACHE_REFRESH, CACHE_BYPASS], default=CACHE_USE,
+                        help="response cache mode for this run")
+    parser.add_argument("--speakers", choices=[SPEAKERS_AUTO, SPEAKERS_FSM, SPEAKERS_FIXED], default=SPEAKERS_AUTO,
+                        help="Dragonshield speaker selection: LLM-selected every round, fixed flow with an "
+                             "LLM-selected feedback loop, or fixed flow with a single feedback pass")
+    parser.add_argument("--max-feedback-rounds", type=int, default=DEFAULT_MAX_FEEDBACK_ROUNDS,
+                        help="Feedbacker turns before the chat moves on to RiskManagement")
+    parser.add_argument("--report-retries", type=int, default=1,
+                        help="times a Dragonshield chat without a report is run again before the task fails")
+    parser.add_argument("--judge", choices=[JUDGE_VERBOSE, JUDGE_COMPACT], default=JUDGE_VERBOSE,
+                        help="verbose judge explanations (for audits), or compact criterion scores and verdicts "
+                             "through function calling")
+    parser.add_argument("--context", choices=[CONTEXT_FULL, CONTEXT_PRUNED], default=CONTEXT_FULL,
+                        help="full group chat history for every Dragonshield call, or per-agent pruned history")
+    parser.add_argument("--context-budget", type=int, default=DEFAULT_CONTEXT_BUDGET,
+                        help="history tokens per Dragonshield call with --context pruned")
+    parser.add_argument("--task-timeout", type=float, default=DEFAULT_DEADLINES["task"],
+                        help="seconds a task may take in all (no limit by default)")
+    parser.add_argument("--dragonshield-timeout", type=float, default=DEFAULT_DEADLINES["dragonshield"],
+                        help="seconds the Dragonshield group chat may take")
+    parser.add_argument("--advisor-timeout", type=float, default=DEFAULT_DEADLINES["jsa_advisor"],
+                        help="seconds the JSA Advisor call may take")
+    parser.add_argument("--judge-timeout", type=float, default=DEFAULT_DEADLINES["judge"],
+                        help="seconds each judge call may take")
+    parser.add_argument("--hedge", action="store_true",
+                        help="send advisor and judge calls a second time once they take longer than their p95")
+    parser.add_argument("--run-id", help="id of the run to create, or of an interrupted run to resume")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"),
+                        help="OpenAI API key (defaults to $OPENAI_API_KEY)")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("an OpenAI API key is required (--api-key or $OPENAI_API_KEY)")
+
+    _, failed = run_batch(args.tasks, args.out, args.api_key, args.concurrency, args.cache, args.run_id,
+                          speaker_mode=args.speakers, max_feedback_rounds=args.max_feedback_rounds,
+                          report_retries=args.report_retries, judge_mode=args.judge, context_mode=args.context,
+                          context_budget=args.context_budget,
+                          deadlines={"task": args.task_timeout, "dragonshield": args.dragonshield_timeout,
+                                     "jsa_advisor": args.advisor_timeout, "judge": args.judge_timeout},
+                          hedge=args.hedge)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
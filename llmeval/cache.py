@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Cache modes for a single run
+CACHE_USE = "use"          # read cached responses and store new ones
+CACHE_REFRESH = "refresh"  # always call the model and overwrite the cached response
+CACHE_BYPASS = "bypass"    # neither read nor write the cache
+
+# Labels for the cache mode selector on the pages
+CACHE_MODE_LABELS = {
+    "Use cached responses": CACHE_USE,
+    "Refresh cached responses": CACHE_REFRESH,
+    "Bypass cache": CACHE_BYPASS,
+}
+
+DEFAULT_CACHE_PATH = os.environ.get("LLMEVAL_CACHE_PATH", os.path.join(".llmeval", "responses.sqlite"))
+
+
+def make_key(model, temperature, messages, agent=None, **params):
+    """
+    Returns a content hash for an LLM request.
+    The system prompt is part of the message list, so it is covered by the hash as well.
+    """
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "messages": messages,
+        "agent": agent,
+        "params": params,
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed store of raw LLM responses keyed by request hash.
+    Entries older than max_age seconds are dropped, and the least recently used
+    entries are evicted once the cache holds more than max_entries or max_bytes.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=20000, max_bytes=256 * 1024 * 1024,
+                 max_age=30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.max_age is not None and now - row[1] > self.max_age:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, response):
+        """Store response under key and evict entries over the configured limits."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        if self.max_age is not None:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+
+        count, total_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        # Walk entries from least to most recently used until both limits are met
+        excess_entries = count - self.max_entries if self.max_entries is not None else 0
+        excess_bytes = total_bytes - self.max_bytes if self.max_bytes is not None else 0
+        if excess_entries <= 0 and excess_bytes <= 0:
+            return
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            evicted.append((key,))
+            excess_entries -= 1
+            excess_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def clear(self):
+        """Remove every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Return the number of cached responses and their total size in bytes."""
+        with self._lock:
+            count, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": count, "bytes": total_bytes}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide response cache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,82 @@
+from llmeval.ratelimit import estimate_tokens
+
+# How much of the group chat history each Dragonshield call sees
+CONTEXT_FULL = "full"      # every agent sees every message, as autogen sends them
+CONTEXT_PRUNED = "pruned"  # per-agent visibility, superseded drafts summarized, a token budget per call
+CONTEXT_MODE_LABELS = {
+    "Full history": CONTEXT_FULL,
+    "Pruned per agent": CONTEXT_PRUNED,
+}
+# Prompt tokens of the conversation in one call, not counting the agent's system prompt
+DEFAULT_CONTEXT_BUDGET = 6000
+SUMMARY_CHARS = 300
+
+# Whose messages each agent sees besides the task: "all" of them, only the "latest", or the latest
+# with the earlier, superseded ones summarized. The flow comes from the agents' prompts.
+AGENT_VISIBILITY = {
+    "ProjectManagerAgent": {},
+    "SafetyInspectorAgent": {"ProjectManagerAgent": "all"},
+    "RiskAssessmentAgent": {"SafetyInspectorAgent": "all", "RiskAssessmentAgent": "summary",
+                            "FeedbackerAgent": "summary"},
+    "FeedbackerAgent": {"SafetyInspectorAgent": "all", "RiskAssessmentAgent": "latest", "FeedbackerAgent": "summary"},
+    "RiskManagementAgent": {"RiskAssessmentAgent": "latest", "FeedbackerAgent": "latest"},
+    "ReporterAgent": {"ProjectManagerAgent": "all", "RiskAssessmentAgent": "latest", "FeedbackerAgent": "latest",
+                      "RiskManagementAgent": "all"},
+}
+
+
+def summarize(message):
+    """Returns a copy of a message shortened to its opening, marked as superseded."""
+    content = " ".join((message.get("content") or "").split())
+    if len(content) > SUMMARY_CHARS:
+        content = content[:SUMMARY_CHARS] + "…"
+    return dict(message, content=f"[Superseded by a later message, summarized] {content}")
+
+
+def fit_budget(messages, budget):
+    """
+    Summarizes messages from the oldest on until the conversation fits budget tokens.
+    The task (the first message) and the newest message are always kept whole.
+    """
+    messages = list(messages)
+    for i in range(1, len(messages) - 1):
+        if estimate_tokens(messages) <= budget:
+            break
+        messages[i] = summarize(messages[i])
+    return messages
+
+
+def visible_context(agent_name, messages, budget=DEFAULT_CONTEXT_BUDGET):
+    """
+    Returns the part of an agent's group chat history it needs for its next turn.
+    Messages an agent sent itself have no name in its own history, only the "assistant" role.
+    """
+    visibility = AGENT_VISIBILITY.get(agent_name)
+    if visibility is None or not messages:
+        return fit_budget(messages, budget)
+
+    def speaker(message):
+        return agent_name if message.get("role") == "assistant" else message.get("name")
+
+    latest = {}
+    for i, message in enumerate(messages):
+        latest[speaker(message)] = i
+    context = [messages[0]]
+    for i, message in enumerate(messages[1:], start=1):
+        rule = visibility.get(speaker(message))
+        if rule == "all" or (rule is not None and i == latest[speaker(message)]):
+            context.append(message)
+        elif rule == "summary":
+            context.append(summarize(message))
+    return fit_budget(context, budget)
+
+
+def selector_context(messages, budget=DEFAULT_CONTEXT_BUDGET):
+    """
+    Returns the history the group chat manager needs to pick the next speaker: the task and the
+    newest message whole, everything in between summarized, followed by the selection prompt.
+    """
+    *history, prompt = messages
+    if len(history) > 2:
+        history = [history[0]] + [summarize(message) for message in history[1:-1]] + [history[-1]]
+    return fit_budget(history, budget) + [prompt]
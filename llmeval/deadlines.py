@@ -0,0 +1,116 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+# Longest a cancelled or expired call keeps waiting for a rate limit budget or a retry before it notices
+CHECK_INTERVAL = 0.5
+
+
+class StageTimeout(Exception):
+    """
+    Raised in a task when the deadline of one of its stages, or of the whole task, has passed.
+    deadline names the deadline that passed, when it isn't the stage's own.
+    """
+
+    def __init__(self, stage, seconds, deadline=None):
+        self.stage = stage
+        self.seconds = seconds
+        self.deadline = deadline or stage
+        if self.deadline == stage:
+            super().__init__(f"{stage} timed out after {seconds:g}s")
+        else:
+            super().__init__(f"{stage} timed out: the {self.deadline} deadline of {seconds:g}s passed")
+
+
+class TaskCancelled(Exception):
+    """Raised in a task that was cancelled while it was running."""
+
+
+class Deadline:
+    """
+    The time a task or one of its stages has to finish by, and the event that cancels it.
+    A deadline nested in another one also expires with it and is cancelled with it.
+    Without seconds it never expires by itself; without a cancel event only an enclosing one can cancel it.
+    """
+
+    def __init__(self, name, seconds=None, cancel=None, parent=None):
+        self.name = name
+        self.seconds = seconds
+        self.cancel = cancel
+        self.parent = parent
+        self.expires = time.monotonic() + seconds if seconds is not None else None
+
+    def _chain(self):
+        scope = self
+        while scope is not None:
+            yield scope
+            scope = scope.parent
+
+    def cancelled(self):
+        return any(scope.cancel is not None and scope.cancel.is_set() for scope in self._chain())
+
+    def remaining(self):
+        """Return the seconds left before this deadline or an enclosing one passes, or None."""
+        now = time.monotonic()
+        left = [scope.expires - now for scope in self._chain() if scope.expires is not None]
+        return min(left) if left else None
+
+    def check(self):
+        """Raise TaskCancelled or StageTimeout if the work under this deadline has to stop."""
+        if self.cancelled():
+            raise TaskCancelled(f"{self.name} was cancelled")
+        now = time.monotonic()
+        # The innermost deadline that passed names the stage that timed out
+        for scope in self._chain():
+            if scope.expires is not None and now >= scope.expires:
+                raise StageTimeout(scope.name, scope.seconds)
+
+    def sleep(self, seconds):
+        """Sleep like time.sleep, but stop as soon as the deadline passes or it is cancelled."""
+        end = time.monotonic() + seconds
+        while True:
+            self.check()
+            left = end - time.monotonic()
+            if left <= 0:
+                return
+            remaining = self.remaining()
+            wait = min(left, CHECK_INTERVAL, remaining if remaining is not None else left)
+            event = next((scope.cancel for scope in self._chain() if scope.cancel is not None), None)
+            if event is not None:
+                event.wait(max(wait, 0))
+            else:
+                time.sleep(max(wait, 0))
+
+
+_current = contextvars.ContextVar("llmeval_deadline", default=None)
+
+
+def current_deadline():
+    """Return the deadline of the code running in this thread, or None."""
+    return _current.get()
+
+
+@contextmanager
+def within(scope):
+    """Run the block under an existing deadline, e.g. one created in another thread."""
+    token = _current.set(scope)
+    try:
+        yield scope
+    finally:
+        _current.reset(token)
+
+
+def deadline(name, seconds=None, cancel=None, parent=None):
+    """
+    Runs the block under a new deadline nested in the current one (or in parent).
+    Every model call inside it checks the deadline before it starts and while its tokens stream in,
+    and is sent with a request timeout that ends with it.
+    """
+    return within(Deadline(name, seconds, cancel, parent if parent is not None else _current.get()))
+
+
+def check_deadline():
+    """Raise TaskCancelled or StageTimeout if the current deadline says the work has to stop."""
+    scope = _current.get()
+    if scope is not None:
+        scope.check()
@@ -0,0 +1,156 @@
+import argparse
+import csv
+import glob
+import hashlib
+import importlib.util
+import os
+import sys
+import threading
+
+import xlsxwriter
+
+from llmeval.store import get_store
+from llmeval.telemetry import CALL_COLUMNS
+
+EXPORT_DIR = os.environ.get("LLMEVAL_EXPORT_DIR", os.path.join(".llmeval", "exports"))
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+PARQUET_BATCH_SIZE = 256
+
+
+def result_columns(results):
+    """Return the column names over all results, in the order they first appear."""
+    columns = {}
+    for result in results:
+        for key in result:
+            columns.setdefault(key, None)
+    return list(columns)
+
+
+def write_excel(results, columns, path):
+    """
+    Writes results to an xlsx file row by row in constant-memory mode.
+    Column widths are tracked while writing, so the rows are never held in memory.
+    """
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    worksheet = workbook.add_worksheet("JSA Evaluations")
+    widths = [len(column) for column in columns]
+    worksheet.write_row(0, 0, columns)
+    for row, result in enumerate(results, start=1):
+        for col, column in enumerate(columns):
+            value = result.get(column)
+            if value is None:
+                continue
+            worksheet.write(row, col, value)
+            widths[col] = max(widths[col], len(str(value)))
+    # Auto-adjust columns' width
+    for col, width in enumerate(widths):
+        worksheet.set_column(col, col, width + 2)  # Add a little extra space
+    workbook.close()
+
+
+def write_csv(results, columns, path):
+    """Writes results to a CSV file one row at a time."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
+
+
+def write_parquet(results, columns, path):
+    """
+    Writes results to a Parquet file in row groups of PARQUET_BATCH_SIZE results.
+    Every column is stored as a nullable string.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column, pa.string()) for column in columns])
+
+    def write_batch(batch):
+        data = {column: [None if result.get(column) is None else str(result[column]) for result in batch]
+                for column in columns}
+        writer.write_table(pa.table(data, schema=schema))
+
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for result in results:
+            batch.append(result)
+            if len(batch) == PARQUET_BATCH_SIZE:
+                write_batch(batch)
+                batch = []
+        if batch:
+            write_batch(batch)
+
+
+WRITERS = {"xlsx": write_excel, "csv": write_csv}
+# Parquet needs pyarrow, which isn't a pandas dependency; without it the format isn't offered
+if importlib.util.find_spec("pyarrow") is not None:
+    WRITERS["parquet"] = write_parquet
+
+
+def export_rows(store, run_ids, kind):
+    """Yields the rows of an export: the results of the runs, or the telemetry record of every model call."""
+    return store.iter_results(run_ids) if kind == "results" else store.iter_calls(run_ids)
+
+
+def _run_key(run_ids):
+    return hashlib.sha256("\n".join(run_ids).encode("utf-8")).hexdigest()[:16]
+
+
+def export_path(store, run_ids, fmt, export_dir=EXPORT_DIR, kind="results"):
+    """
+    Returns the path the export of the given runs has at their current version, without writing it;
+    it exists once export_results has written it and nothing changed since.
+    """
+    version = store.results_version(run_ids) if kind == "results" else store.calls_version(run_ids)
+    return os.path.join(export_dir, f"{kind}-{_run_key(run_ids)}-{version}.{fmt}")
+
+
+def export_results(store, run_ids, fmt, export_dir=EXPORT_DIR, kind="results"):
+    """
+    Returns the path of an export of the given runs, writing it only if the results changed since the last export.
+    Results are streamed from the store, so the export never holds every result in memory.
+    With kind="calls", the per-call telemetry of the runs is exported instead.
+    """
+    run_key = _run_key(run_ids)
+    path = export_path(store, run_ids, fmt, export_dir, kind)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(export_dir, exist_ok=True)
+    # Exports of older versions of the same runs are superseded
+    for old_path in glob.glob(os.path.join(export_dir, f"{kind}-{run_key}-*.{fmt}")):
+        try:
+            os.remove(old_path)
+        except FileNotFoundError:
+            pass
+    columns = result_columns(export_rows(store, run_ids, kind)) if kind == "results" else CALL_COLUMNS
+    # Write to a temporary file first so a concurrent session never serves a half-written export
+    temporary_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    WRITERS[fmt](export_rows(store, run_ids, kind), columns, temporary_path)
+    os.replace(temporary_path, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export evaluation results from the result store.")
+    parser.add_argument("run_ids", nargs="+", help="runs to export")
+    parser.add_argument("--format", choices=list(WRITERS), default="csv")
+    parser.add_argument("--out", required=True, help="file to write")
+    parser.add_argument("--calls", action="store_true", help="export the per-call telemetry instead of the results")
+    args = parser.parse_args(argv)
+
+    store = get_store()
+    kind = "calls" if args.calls else "results"
+    columns = result_columns(export_rows(store, args.run_ids, kind)) if kind == "results" else CALL_COLUMNS
+    WRITERS[args.format](export_rows(store, args.run_ids, kind), columns, args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
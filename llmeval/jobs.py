@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from llmeval.cache import CACHE_USE
+from llmeval.context import CONTEXT_FULL
+from llmeval.pipeline import JUDGE_VERBOSE, SPEAKERS_AUTO, run_jsa_evaluation
+from llmeval.store import get_store
+
+# Tasks evaluated at the same time across every job of the process
+DEFAULT_JOB_WORKERS = int(os.environ.get("LLMEVAL_JOB_WORKERS", "8"))
+# Finished jobs are forgotten after a day; their results stay in the result store
+JOB_RETENTION_SECONDS = 24 * 3600
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_CANCELLED = "cancelled"
+
+
+class Job:
+    """
+    An evaluation submitted to the job queue: the (index, task) pairs of a run and their options.
+    Its fields are updated by the workers; pages read its progress through snapshot().
+    """
+
+    def __init__(self, owner, run_id, tasks, api_key, max_concurrency, options):
+        self.job_id = uuid.uuid4().hex[:8]
+        self.owner = owner
+        self.run_id = run_id
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.options = options
+        self.total = len(tasks)
+        self.pending = deque(tasks)
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = False
+        # Set on cancel, so the tasks that are already running stop at their next model call or streamed token
+        self.cancel_event = threading.Event()
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        # index -> [source, text] of the stage each running task is streaming; workers update it while
+        # pages read it, so both go through _lock
+        self.live = {}
+        self._lock = threading.Lock()
+        # (index, task, winner and total time, error) of every finished task, in the order they finished;
+        # a task that already had a result in the run has neither
+        self.outcomes = []
+
+    @property
+    def state(self):
+        if self.finished is not None:
+            return JOB_CANCELLED if self.cancelled else JOB_COMPLETED
+        return JOB_QUEUED if self.started is None else JOB_RUNNING
+
+    def on_event(self, index, kind, source, text):
+        with self._lock:
+            line = self.live.setdefault(index, [source, ""])
+            if line[0] != source or kind == "message":
+                line[:] = [source, text]
+            else:
+                line[1] += text
+
+    def finish_task(self, index, task, summary, error):
+        """Record the outcome of a task and drop its live line."""
+        with self._lock:
+            self.live.pop(index, None)
+            self.outcomes.append((index, task, summary, error))
+
+    def snapshot(self):
+        """Return copies of the outcomes and of the (index, source, text) live lines, ordered by index."""
+        with self._lock:
+            return list(self.outcomes), [(index, source, text) for index, (source, text) in sorted(self.live.items())]
+
+
+class JobQueue:
+    """
+    Process-wide queue of evaluation jobs, run by a fixed pool of worker threads.
+    Workers take tasks from the owners (browser sessions) in turn, so a session that submits a large batch
+    doesn't hold up everyone else's, and each job runs at most max_concurrency of its tasks at once.
+    Jobs keep running when the session that submitted them disconnects.
+    """
+
+    def __init__(self, workers=DEFAULT_JOB_WORKERS, store=None):
+        self.store = store or get_store()
+        self._jobs = {}
+        # owner -> jobs with tasks left, in submission order; owners are served round-robin
+        self._owners = OrderedDict()
+        self._condition = threading.Condition()
+        self._workers = [threading.Thread(target=self._work, name=f"llmeval-job-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, owner, run_id, tasks, api_key, max_concurrency=4, cache_mode=CACHE_USE,
+               speaker_mode=SPEAKERS_AUTO, judge_mode=JUDGE_VERBOSE, context_mode=CONTEXT_FULL, deadlines=None,
+               hedge=False):
+        """Queue the (index, task) pairs of a run for evaluation and return the job."""
+        job = Job(owner, run_id, list(tasks), api_key, max_concurrency,
+                  {"cache_mode": cache_mode, "speaker_mode": speaker_mode, "judge_mode": judge_mode,
+                   "context_mode": context_mode, "deadlines": deadlines, "hedge": hedge})
+        with self._condition:
+            for job_id in [job_id for job_id, old in self._jobs.items()
+                           if old.finished is not None and old.finished < time.time() - JOB_RETENTION_SECONDS]:
+                del self._jobs[job_id]
+            self._jobs[job.job_id] = job
+            if job.pending:
+                self._owners.setdefault(owner, []).append(job)
+            else:
+                job.finished = time.time()
+            self._condition.notify_all()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Drop the tasks of a job that haven't started and stop the running ones at their next model call
+        or streamed token. The stages they already finished stay checkpointed, so resuming the run picks them up.
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished is not None:
+                return
+            job.cancelled = True
+            job.cancel_event.set()
+            job.pending.clear()
+            self._finish_if_done(job)
+
+    def queued_tasks(self):
+        """Return the number of tasks waiting for a worker over all jobs."""
+        with self._condition:
+            return sum(len(job.pending) for jobs in self._owners.values() for job in jobs)
+
+    def _finish_if_done(self, job):
+        if not job.pending and not job.running and job.finished is None:
+            job.finished = time.time()
+            jobs = self._owners.get(job.owner)
+            if jobs is not None and job in jobs:
+                jobs.remove(job)
+                if not jobs:
+                    del self._owners[job.owner]
+
+    def _next_task(self):
+        """Take the next task to start, from the first owner in turn with a job below its concurrency."""
+        for owner, jobs in self._owners.items():
+            for job in jobs:
+                if job.pending and job.running < job.max_concurrency:
+                    job.running += 1
+                    job.started = job.started or time.time()
+                    # This owner goes to the back of the line
+                    self._owners.move_to_end(owner)
+                    return job, job.pending.popleft()
+        return None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                item = self._next_task()
+                while item is None:
+                    self._condition.wait()
+                    item = self._next_task()
+            job, (index, task) = item
+            result = error = None
+            try:
+                self.store.add_task(job.run_id, index, task)
+                # A task finished by an earlier attempt of the run is not evaluated again
+                if not self.store.has_result(job.run_id, index):
+                    checkpoint = self.store.checkpoint(job.run_id, index)
+                    result = run_jsa_evaluation(task, job.api_key, checkpoint=checkpoint,
+                                                on_event=lambda *event: job.on_event(index, *event),
+                                                cancel=job.cancel_event, **job.options)
+            except Exception as e:
+                error = e
+            with self._condition:
+                job.running -= 1
+                # The full result is in the store; the job only keeps what its progress shows
+                summary = {key: result[key] for key in ("Winner", "Total Time")} if result is not None else None
+                job.finish_task(index, task, summary, error)
+                if error is None:
+                    job.completed += 1
+                else:
+                    job.failed += 1
+                self._finish_if_done(job)
+                self._condition.notify_all()
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide job queue, starting its workers on first use."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
@@ -0,0 +1,24 @@
+import importlib
+
+
+class LazyModule:
+    """
+    Stands in for a module that is imported the first time one of its attributes is used.
+    Pages and the modules they import reference heavy dependencies (autogen, openai, pandas, numpy)
+    through it, so a page renders without loading the ones it doesn't need yet.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attribute):
+        # After the first use this is a lookup in sys.modules
+        return getattr(importlib.import_module(self._name), attribute)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+def lazy_import(name):
+    """Return a stand-in for the named module that imports it on first use."""
+    return LazyModule(name)
@@ -0,0 +1,375 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llmeval.cache import CACHE_BYPASS, CACHE_USE, get_cache, make_key
+from llmeval.deadlines import Deadline, check_deadline, current_deadline, within
+from llmeval.lazy import lazy_import
+from llmeval.ratelimit import EXPECTED_COMPLETION_TOKENS, RateLimiter, backoff_delay, estimate_tokens
+from llmeval.telemetry import estimate_cost, record_call, usage_counts
+
+# The OpenAI SDK is imported by the first call, not by the pages that import this module
+openai = lazy_import("openai")
+openai_chat = lazy_import("openai.types.chat")
+
+MODEL = "gpt-4-1106-preview"
+MAX_RETRIES = 6
+# Chat completions endpoint, e.g. a local llmeval.mock server (defaults to the OpenAI API)
+BASE_URL = os.environ.get("LLMEVAL_BASE_URL")
+# Seconds a single request may take before it is abandoned and retried; a deadline can shorten it
+REQUEST_TIMEOUT = float(os.environ.get("LLMEVAL_REQUEST_TIMEOUT", "300"))
+
+# A hedged call sends a second request once the first has taken longer than this percentile of the
+# agent's recent uncached calls, and only when there are enough of them to estimate it
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+# One pooled client and rate limiter per API key, shared by every task and session in the process
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key):
+    """
+    Returns the process-wide OpenAI client and rate limiter for an API key.
+    The client keeps its HTTP connections alive between calls; retries are left to call_with_retries.
+    """
+    with _clients_lock:
+        if api_key not in _clients:
+            client = openai.OpenAI(api_key=api_key, base_url=BASE_URL, max_retries=0, timeout=REQUEST_TIMEOUT)
+            _clients[api_key] = (client, RateLimiter())
+        return _clients[api_key]
+
+
+def queue_depth(api_key):
+    """Return how many requests for an API key are waiting for budget or in flight."""
+    return get_client(api_key)[1].queue_depth()
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def collect_stream(stream, on_token):
+    """
+    Forwards the tokens of a streamed completion to on_token and assembles the chunks
+    into the same ChatCompletion a non-streaming call would have returned.
+    """
+    content = []
+    last_chunk = None
+    usage = None
+    finish_reason = None
+    for chunk in stream:
+        last_chunk = chunk
+        if chunk.usage is not None:
+            usage = chunk.usage
+        for choice in chunk.choices:
+            if choice.delta.content:
+                content.append(choice.delta.content)
+                on_token(choice.delta.content)
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+    if last_chunk is None:
+        # The connection dropped before the first chunk; call_with_retries retries it like any connection error
+        raise openai.APIConnectionError(message="The stream ended without a chunk.", request=stream.response.request)
+    return openai_chat.ChatCompletion.model_validate({
+        "id": last_chunk.id,
+        "object": "chat.completion",
+        "created": last_chunk.created,
+        "model": last_chunk.model,
+        "system_fingerprint": last_chunk.system_fingerprint,
+        "choices": [{
+            "index": 0,
+            "finish_reason": finish_reason or "stop",
+            "message": {"role": "assistant", "content": "".join(content)},
+        }],
+        "usage": usage.model_dump() if usage is not None else None,
+    })
+
+
+def request_timeout(timeout=None, scope=None):
+    """Return the timeout of the next request: timeout, cut short by the remaining time of a deadline."""
+    remaining = scope.remaining() if scope is not None else None
+    limits = [limit for limit in (timeout, remaining) if limit is not None]
+    return max(min(limits), 0.01) if limits else None
+
+
+def call_with_retries(api_key, params, on_token=None, call_stats=None, timeout=None):
+    """
+    Sends a chat completion request through the rate limiter of its API key.
+    429s, 5xx responses, connection errors and timeouts are retried with jittered exponential backoff.
+    With on_token, the completion is streamed and every token is passed to on_token as it arrives.
+    If a call_stats dict is given, it receives the number of retries and the time of the first streamed token.
+    timeout overrides REQUEST_TIMEOUT for each attempt. Under a deadline (see llmeval.deadlines), no attempt
+    outlives it: the call raises StageTimeout or TaskCancelled before an attempt, while waiting for budget
+    or a retry, and between streamed tokens, and each request times out when the deadline passes.
+    """
+    client, limiter = get_client(api_key)
+    scope = current_deadline()
+    reserved = estimate_tokens(params["messages"]) + EXPECTED_COMPLETION_TOKENS
+    for attempt in range(MAX_RETRIES + 1):
+        if scope is not None:
+            scope.check()
+        limiter.acquire(reserved, scope)
+        used = None
+        streamed = []
+        try:
+            request = dict(params)
+            attempt_timeout = request_timeout(timeout, scope)
+            if attempt_timeout is not None:
+                request["timeout"] = attempt_timeout
+            if on_token is None:
+                completion = client.chat.completions.create(**request)
+            else:
+                stream = client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **request)
+
+                def forward(token):
+                    # A cancelled or expired task stops reading the stream, which closes the request
+                    if scope is not None:
+                        scope.check()
+                    if not streamed and call_stats is not None:
+                        call_stats["first_token"] = time.time()
+                    streamed.append(token)
+                    on_token(token)
+
+                try:
+                    completion = collect_stream(stream, forward)
+                finally:
+                    stream.close()
+            used = completion.usage.total_tokens if completion.usage is not None else None
+            if call_stats is not None:
+                call_stats["retries"] = attempt
+            return completion
+        except (openai.APIStatusError, openai.APIConnectionError) as e:
+            # A request that timed out with its deadline is a timeout of the stage, not of the connection
+            if scope is not None:
+                scope.check()
+            status_code = getattr(e, "status_code", None)
+            retryable = status_code is None or status_code == 429 or status_code >= 500
+            # A stream that already delivered tokens can't be retried without repeating them
+            if not retryable or attempt == MAX_RETRIES or streamed:
+                raise
+            delay = _retry_after(e) or backoff_delay(attempt)
+            if status_code == 429:
+                # Every caller on this key backs off, not just the one that hit the limit
+                limiter.pause(delay)
+        finally:
+            limiter.release(reserved, used)
+        if scope is not None:
+            scope.sleep(delay)
+        else:
+            time.sleep(delay)
+
+
+class LatencyTracker:
+    """Wall times of the recent uncached calls of every agent, for the hedge threshold."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self.hedges = {}
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, agent, seconds):
+        with self._lock:
+            self._samples.setdefault(agent, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, agent, q=HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES):
+        """Return the q-th percentile of the agent's recent call times, or None with fewer than min_samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(agent, ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+    def record_hedge(self, agent, won):
+        """Count a hedged request of an agent, and whether it answered before the original one."""
+        with self._lock:
+            counts = self.hedges.setdefault(agent, {"sent": 0, "won": 0})
+            counts["sent"] += 1
+            counts["won"] += int(won)
+
+
+latencies = LatencyTracker()
+
+# Runs the attempts of hedged calls; the calling thread waits for the first one to complete
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llmeval-hedge")
+
+
+def _call_within(scope, *args):
+    with within(scope):
+        return call_with_retries(*args)
+
+
+def hedged_call(api_key, params, on_token, call_stats, timeout, hedge_after, agent=None):
+    """
+    Sends a request like call_with_retries and, if it hasn't completed within hedge_after seconds,
+    sends it again; returns the completion that arrives first and cancels the other request.
+    Only the first request streams to on_token; when the second one wins, its text is passed to
+    on_token(text, replace=True) in one piece, replacing what the first had streamed. Both run under
+    the current deadline.
+    """
+    parent = current_deadline()
+    attempts = {}
+    # Closed once the hedge wins, so a token of the cancelled stream can't follow the replacement
+    stream_lock = threading.Lock()
+    streaming = [True]
+
+    def forward(token):
+        with stream_lock:
+            if streaming[0]:
+                on_token(token)
+
+    def send(stream):
+        # Each request has its own cancel event, so the slower one can be stopped on its own
+        scope = Deadline("request", cancel=threading.Event(), parent=parent)
+        stats = {}
+        future = _hedge_executor.submit(_call_within, scope, api_key, params, stream, stats, timeout)
+        attempts[future] = (scope, stats)
+        return future
+
+    first = send(forward if on_token is not None else None)
+    done, _ = wait([first], timeout=hedge_after)
+    hedged = not done
+    if hedged:
+        send(None)
+    error = None
+    while attempts:
+        done, _ = wait(attempts, return_when=FIRST_COMPLETED)
+        for future in done:
+            _, stats = attempts.pop(future)
+            try:
+                completion = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            for scope, _ in attempts.values():
+                scope.cancel.set()
+            if hedged:
+                latencies.record_hedge(agent, won=future is not first)
+            if on_token is not None and future is not first:
+                with stream_lock:
+                    streaming[0] = False
+                    on_token(completion.choices[0].message.content or "", replace=True)
+            if call_stats is not None:
+                call_stats.update(stats)
+            return completion
+    raise error
+
+
+def chat_completion(api_key, messages, model=MODEL, temperature=None, agent=None, cache_mode=CACHE_USE,
+                    on_token=None, hedge=False, timeout=None, **params):
+    """
+    Creates a chat completion, serving repeated requests from the response cache.
+    With on_token, tokens are passed to it as they are generated (a cached response arrives as one piece,
+    a hedged one may replace the tokens streamed so far, see hedged_call); the returned completion is the
+    same either way.
+    With hedge, a call that takes longer than the agent's p95 is sent a second time (see hedged_call).
+    timeout is the per-request timeout (REQUEST_TIMEOUT by default).
+    Extra request parameters (tools, max_tokens, ...) are sent as given and are part of the cache key.
+    """
+    check_deadline()
+    started = time.time()
+    cache = get_cache()
+    key = make_key(model, temperature, messages, agent, **params)
+    if cache_mode == CACHE_USE:
+        cached = cache.get(key)
+        if cached is not None:
+            completion = openai_chat.ChatCompletion.model_validate_json(cached)
+            if on_token is not None:
+                on_token(completion.choices[0].message.content or "")
+            record_call(agent, model, started, time.time() - started, completion, cache_hit=True)
+            return completion
+
+    params = dict(params, model=model, messages=messages)
+    if temperature is not None:
+        params["temperature"] = temperature
+    call_stats = {}
+    hedge_after = latencies.percentile(agent) if hedge else None
+    if hedge_after is not None:
+        completion = hedged_call(api_key, params, on_token, call_stats, timeout, hedge_after, agent)
+    else:
+        completion = call_with_retries(api_key, params, on_token, call_stats, timeout)
+    # A hedged call took at least the threshold, so its time keeps the tail where it was
+    latencies.record(agent, time.time() - started)
+    first_token = call_stats.get("first_token")
+    record_call(agent, model, started, time.time() - started, completion, cache_hit=False,
+                ttft_seconds=first_token - started if first_token is not None else None,
+                retries=call_stats.get("retries", 0))
+
+    if cache_mode != CACHE_BYPASS:
+        cache.set(key, completion.model_dump_json())
+    return completion
+
+
+def llm_config(api_key, temperature=0.1, timeout=REQUEST_TIMEOUT):
+    """
+    Returns the autogen llm_config for agents whose calls go through CachedModelClient.
+    autogen's own disk cache is switched off so that the cache mode of the run is authoritative.
+    timeout is the per-request timeout of the agents' calls.
+    """
+    config = {
+        "model": MODEL,
+        "temperature": temperature,
+        "api_key": api_key,
+        "timeout": timeout,
+        "model_client_cls": "CachedModelClient",
+    }
+    if BASE_URL:
+        config["base_url"] = BASE_URL
+    return {"config_list": [config], "cache_seed": None}
+
+
+class CachedModelClient:
+    """autogen model client that routes agent calls through chat_completion."""
+
+    def __init__(self, config, agent=None, cache_mode=CACHE_USE, **kwargs):
+        self.api_key = config.get("api_key")
+        self.timeout = config.get("timeout")
+        self.agent = agent
+        self.cache_mode = cache_mode
+
+    def create(self, params):
+        return chat_completion(
+            self.api_key,
+            params["messages"],
+            model=params.get("model", MODEL),
+            temperature=params.get("temperature"),
+            agent=self.agent,
+            cache_mode=self.cache_mode,
+            timeout=self.timeout,
+        )
+
+    def message_retrieval(self, response):
+        return [choice.message.content for choice in response.choices]
+
+    def cost(self, response):
+        prompt_tokens, completion_tokens, cached_tokens = usage_counts(response.usage)
+        return estimate_cost(response.model, prompt_tokens, completion_tokens, cached_tokens) or 0
+
+    @staticmethod
+    def get_usage(response):
+        prompt_tokens, completion_tokens, cached_tokens = usage_counts(response.usage)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cost": estimate_cost(response.model, prompt_tokens, completion_tokens, cached_tokens) or 0,
+            "model": response.model,
+        }
+
+
+def register_agents(agents, cache_mode=CACHE_USE):
+    """Attach a CachedModelClient to every agent that talks to the LLM."""
+    for agent in agents:
+        if agent.llm_config:
+            agent.register_model_client(model_client_cls=CachedModelClient, agent=agent.name, cache_mode=cache_mode)
@@ -0,0 +1,424 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+    python -m llmeval.mock stub --port 8765 --latency lognormal:2:0.5 --chunk-delay 0.01
+    python -m llmeval.mock record cassette.jsonl --port 8765
+    python -m llmeval.mock replay cassette.jsonl --port 8765 --latency recorded
+
+Point the app at it with LLMEVAL_BASE_URL=http://127.0.0.1:8765/v1 (any API key is accepted). Every call,
+from the OpenAI client and from the autogen agents alike, then goes to the server instead of the API:
+
+- stub answers every agent with canned replies: a short JSA report from the Reporter and the JSA Advisor, each
+  with its own job steps per task, a verdict drawn from --verdicts from the judge, which mostly prefers the
+  report with more steps, and speaker selections that follow the Dragonshield flow.
+- record forwards every request to the real API (--upstream) and appends the exchange to a cassette.
+- replay answers from cassettes; a request that was never recorded gets a stub reply, or a 404 with --strict.
+
+Replies are deterministic for a given request and --seed. Latencies are drawn per request from --latency
+("fixed:SECONDS", "uniform:LOW:HIGH", "lognormal:MEDIAN:SIGMA" or, for replay, "recorded"), and streamed
+replies arrive in chunks --chunk-delay seconds apart.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import APIStatusError, OpenAI
+
+from llmeval.cache import make_key
+from llmeval.pipeline import SPEAKER_FLOW
+from llmeval.prompts import (
+    COMPACT_JUDGE_PROMPT,
+    FEEDBACKER_PROMPT,
+    JSA_ADVISOR_PROMPT,
+    JUDGE_CRITERIA,
+    JUDGE_PROMPT,
+    PROJECT_MANAGER_PROMPT,
+    REPORTER_PROMPT,
+    RISK_ASSESSMENT_PROMPT,
+    RISK_MANAGEMENT_PROMPT,
+    SAFETY_INSPECTOR_PROMPT,
+)
+from llmeval.ratelimit import estimate_tokens
+
+# Agents recognised by their system prompt
+PROMPT_AGENTS = {
+    PROJECT_MANAGER_PROMPT: "ProjectManagerAgent",
+    SAFETY_INSPECTOR_PROMPT: "SafetyInspectorAgent",
+    RISK_ASSESSMENT_PROMPT: "RiskAssessmentAgent",
+    FEEDBACKER_PROMPT: "FeedbackerAgent",
+    RISK_MANAGEMENT_PROMPT: "RiskManagementAgent",
+    REPORTER_PROMPT: "ReporterAgent",
+    JSA_ADVISOR_PROMPT: "JSAAdvisor",
+    JUDGE_PROMPT: "JSAJudge",
+    COMPACT_JUDGE_PROMPT: "JSAJudge",
+}
+
+JSA_TITLES = {
+    "ReporterAgent": "# Job Safety Analysis: {task}",
+    "JSAAdvisor": "# JSA for {task}",
+}
+
+JSA_TABLE_HEADER = """| Job Step | Hazard | Likelihood | Impact | Risk Level | Preventive Measures |
+|---|---|---|---|---|---|"""
+
+JSA_ROWS = [
+    "Prepare the work area | Slips and trips | P3 | C2 | Low | Keep walkways clear, mark the work zone",
+    "Set up the equipment | Manual handling injury | P4 | C3 | Moderate | Team lifts, mechanical aids",
+    "Carry out the work | Falling objects | P4 | C4 | High | Hard hats, exclusion zone, tool lanyards",
+    "Inspect the finished work | Working at height | P3 | C4 | Moderate | Harness, guardrails, inspection platform",
+    "Remove the equipment | Electric shock | P2 | C4 | Moderate | Isolate and lock out before disconnecting",
+    "Clean up | Cuts from debris | P3 | C2 | Low | Gloves, designated waste containers",
+]
+
+REPORT_ROW = re.compile(r"^\| \d+\. ", re.MULTILINE)
+
+AGENT_REPLIES = {
+    "ProjectManagerAgent": "Job steps for {task}: 1. Prepare the work area. 2. Set up the equipment. "
+                           "3. Carry out the work. 4. Clean up.",
+    "SafetyInspectorAgent": "Hazards: slips and trips, manual handling injury, falling objects, cuts from debris.",
+    "RiskAssessmentAgent": "Risk assessment: slips P3/C2 low, manual handling P4/C3 moderate, "
+                           "falling objects P4/C4 high, cuts P3/C2 low.",
+    "FeedbackerAgent": "The risk assessment is consistent with the hazards identified.",
+    "RiskManagementAgent": "Preventive measures: clear walkways, team lifts, hard hats and an exclusion zone, gloves.",
+}
+
+JUDGE_VERDICTS = {
+    "A": "Response A is more complete and better structured. [[A]]",
+    "B": "Response B is more complete and better structured. [[B]]",
+    "tie": "Both responses cover the job steps, hazards and measures equally well.",
+}
+
+SELECT_PROMPT = re.compile(r"select the next role from (\[.*?\]) to play")
+CHUNK_SIZE = 16
+
+
+class BackendError(Exception):
+    """A request the backend answers with an HTTP error instead of a completion."""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def request_key(body):
+    """Return the cassette key of a chat completion request; streaming options don't change the reply."""
+    params = {name: value for name, value in body.items()
+              if name not in ("model", "temperature", "messages", "stream", "stream_options")}
+    return make_key(body.get("model"), body.get("temperature"), body["messages"], **params)
+
+
+def request_rng(key, seed):
+    """Return a random generator that is the same for every repeat of a request."""
+    return random.Random(int(hashlib.sha256(f"{seed}:{key}".encode("utf-8")).hexdigest()[:16], 16))
+
+
+def make_completion(body, content, function_call=None):
+    """
+    Return a chat completion with the given content and rough token counts.
+    With function_call, a (name, arguments) pair, the reply is a call of that function instead.
+    """
+    message = {"role": "assistant", "content": content}
+    if function_call is not None:
+        name, arguments = function_call
+        content = json.dumps(arguments)
+        message = {"role": "assistant", "content": None, "tool_calls": [{
+            "id": "call-mock", "type": "function", "function": {"name": name, "arguments": content}}]}
+    prompt_tokens = estimate_tokens(body["messages"])
+    completion_tokens = len(content) // 4 + 1
+    return {
+        "id": "chatcmpl-mock-" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:12],
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "finish_reason": "tool_calls" if function_call is not None else "stop",
+                     "message": message}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def jsa_report(agent, task, seed):
+    """
+    Return a canned JSA report from the Reporter or the JSA Advisor. Each agent lists its own number of
+    job steps for a task, so the two systems answer differently and either may be the more complete.
+    """
+    rng = request_rng(f"{agent}:{task}", seed)
+    steps = sorted(rng.sample(range(len(JSA_ROWS)), rng.randint(3, len(JSA_ROWS))))
+    rows = [f"| {number}. {JSA_ROWS[step]} |" for number, step in enumerate(steps, 1)]
+    return "\n".join([JSA_TITLES[agent].format(task=task), "", JSA_TABLE_HEADER] + rows) + "\n"
+
+
+def report_steps(comparison, response):
+    """Return the number of job steps in response "A" or "B" of a judge request."""
+    _, _, rest = comparison.partition(f"\n\nResponse {response}:\n")
+    text = rest.split("\n\nResponse B:\n")[0] if response == "A" else rest
+    return len(REPORT_ROW.findall(text))
+
+
+class StubBackend:
+    """
+    Canned replies for every Dragonshield agent, the JSA Advisor and the JSA Judge.
+    verdicts are the chances that the judge prefers the response with more job steps (response A when
+    both have as many), the other response, or neither.
+    """
+
+    def __init__(self, verdicts=(0.7, 0.15, 0.15), seed=0):
+        self.verdicts = verdicts
+        self.seed = seed
+
+    def complete(self, body, api_key):
+        messages = body["messages"]
+        task = next((message["content"] for message in messages if message.get("role") == "user"), "")
+        selection = SELECT_PROMPT.search(messages[-1].get("content") or "")
+        if selection is not None:
+            content = self.select_speaker(messages, json.loads(selection.group(1).replace("'", '"')))
+        else:
+            agent = PROMPT_AGENTS.get(messages[0].get("content"))
+            if agent in ("ReporterAgent", "JSAAdvisor"):
+                content = jsa_report(agent, task.splitlines()[0] if task else "", self.seed)
+            elif agent == "JSAJudge":
+                rng = request_rng(request_key(body), self.seed)
+                better, worse = ("B", "A") if report_steps(task, "B") > report_steps(task, "A") else ("A", "B")
+                verdict = rng.choices([better, worse, "tie"], weights=self.verdicts)[0]
+                if body.get("tools"):
+                    return make_completion(body, None, (body["tools"][0]["function"]["name"], {
+                        "scores": {criterion: {"A": rng.randint(5, 9), "B": rng.randint(5, 9)}
+                                   for criterion in JUDGE_CRITERIA},
+                        "verdict": verdict,
+                        "rationale": JUDGE_VERDICTS[verdict],
+                    })), None
+                content = JUDGE_VERDICTS[verdict]
+            else:
+                content = AGENT_REPLIES.get(agent, "Noted.").format(task=task)
+        return make_completion(body, content), None
+
+    @staticmethod
+    def select_speaker(messages, roles):
+        """Follows the Dragonshield flow; after one feedback pass the Feedbacker hands over to RiskManagement."""
+        names = [message.get("name") for message in messages if message.get("name")]
+        last = names[-1] if names else "Admin"
+        options = [name for name in SPEAKER_FLOW.get(last, []) if name in roles]
+        if last == "FeedbackerAgent" and names.count("FeedbackerAgent") > 1 and "RiskManagementAgent" in options:
+            return "RiskManagementAgent"
+        return options[0] if options else roles[0]
+
+
+class ReplayBackend:
+    """
+    Answers requests from recorded cassettes. A request recorded several times gets its recordings in turn.
+    Requests that were never recorded go to the fallback backend, or fail with a 404 without one.
+    """
+
+    def __init__(self, cassette_paths, fallback=None):
+        self.fallback = fallback
+        self.recordings = {}
+        self._turns = {}
+        self._lock = threading.Lock()
+        for path in cassette_paths:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        exchange = json.loads(line)
+                        self.recordings.setdefault(exchange["key"], []).append(exchange)
+
+    def complete(self, body, api_key):
+        key = request_key(body)
+        recordings = self.recordings.get(key)
+        if not recordings:
+            if self.fallback is None:
+                raise BackendError(404, f"request {key[:12]} is not in the cassettes")
+            return self.fallback.complete(body, api_key)
+        with self._lock:
+            turn = self._turns.get(key, 0)
+            self._turns[key] = turn + 1
+        exchange = recordings[turn % len(recordings)]
+        return exchange["response"], exchange.get("seconds")
+
+
+class RecordBackend:
+    """Forwards requests to the real API and appends every successful exchange to a cassette."""
+
+    def __init__(self, cassette_path, upstream=None):
+        self.cassette_path = cassette_path
+        self.upstream = upstream
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def complete(self, body, api_key):
+        with self._lock:
+            if api_key not in self._clients:
+                self._clients[api_key] = OpenAI(api_key=api_key, base_url=self.upstream, max_retries=0)
+            client = self._clients[api_key]
+        params = {name: value for name, value in body.items() if name not in ("stream", "stream_options")}
+        started = time.time()
+        try:
+            completion = client.chat.completions.create(**params).model_dump()
+        except APIStatusError as e:
+            raise BackendError(e.status_code, str(e))
+        seconds = time.time() - started
+        exchange = {"key": request_key(body), "request": params, "response": completion, "seconds": seconds}
+        with self._lock:
+            with open(self.cassette_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(exchange, ensure_ascii=False) + "\n")
+        return completion, seconds
+
+
+def parse_latency(spec):
+    """
+    Returns latency(rng, recorded) for a latency spec: "fixed:SECONDS", "uniform:LOW:HIGH",
+    "lognormal:MEDIAN:SIGMA", or "recorded" for the duration of the recorded exchange.
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(":")] if args else []
+    if kind == "fixed":
+        return lambda rng, recorded: values[0]
+    if kind == "uniform":
+        return lambda rng, recorded: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda rng, recorded: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "recorded":
+        return lambda rng, recorded: recorded or 0.0
+    raise ValueError(f"unknown latency spec {spec!r}")
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Serves POST /v1/chat/completions, streamed or not, from the server's backend."""
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"no route for {self.path}", "type": "invalid_request_error"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        api_key = self.headers.get("Authorization", "").replace("Bearer ", "", 1)
+        try:
+            completion, recorded = self.server.backend.complete(body, api_key)
+        except BackendError as e:
+            self.send_json(e.status_code, {"error": {"message": str(e), "type": "mock_backend_error"}})
+            return
+
+        # Time to the first token, then the rest of the reply in chunks
+        if self.server.latency is not None:
+            time.sleep(self.server.latency(request_rng(request_key(body), self.server.seed), recorded))
+        if not body.get("stream"):
+            time.sleep(self.server.chunk_delay * len(self.chunks(completion)))
+            self.send_json(200, completion)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+        chunks = self.chunks(completion)
+        for index, text in enumerate(chunks):
+            if index:
+                time.sleep(self.server.chunk_delay)
+            last = index == len(chunks) - 1
+            self.send_event(self.chunk(completion, [{
+                "index": 0,
+                "delta": {"role": "assistant", "content": text} if index == 0 else {"content": text},
+                "finish_reason": completion["choices"][0].get("finish_reason") or "stop" if last else None,
+            }]))
+        if include_usage:
+            self.send_event(self.chunk(completion, [], usage=completion.get("usage")))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    @staticmethod
+    def chunks(completion):
+        content = completion["choices"][0]["message"].get("content") or ""
+        return [content[start:start + CHUNK_SIZE] for start in range(0, len(content), CHUNK_SIZE)] or [""]
+
+    @staticmethod
+    def chunk(completion, choices, usage=None):
+        return {
+            "id": completion["id"],
+            "object": "chat.completion.chunk",
+            "created": completion["created"],
+            "model": completion["model"],
+            "system_fingerprint": completion.get("system_fingerprint"),
+            "choices": choices,
+            "usage": usage,
+        }
+
+    def send_event(self, data):
+        self.wfile.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def send_json(self, status_code, data):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(backend, host="127.0.0.1", port=0, latency="fixed:0", chunk_delay=0.0, seed=0):
+    """
+    Starts a mock server in a background thread and returns it; its base URL is server.base_url.
+    latency is a spec for parse_latency, or None to add no delay (as when recording).
+    """
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.backend = backend
+    server.latency = parse_latency(latency) if latency is not None else None
+    server.chunk_delay = chunk_delay
+    server.seed = seed
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the OpenAI chat completions API.")
+    parser.add_argument("mode", choices=["stub", "record", "replay"])
+    parser.add_argument("cassettes", nargs="*", help="cassette to record to, or cassettes to replay")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="fixed:0",
+                        help='time to first token: "fixed:S", "uniform:LOW:HIGH", "lognormal:MEDIAN:SIGMA" '
+                             'or "recorded" (replay)')
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--verdicts", default="0.7,0.15,0.15",
+                        help="chances that the stub judge prefers the response with more job steps, "
+                             "the other response, or neither")
+    parser.add_argument("--seed", type=int, default=0, help="seed for stub verdicts and latencies")
+    parser.add_argument("--strict", action="store_true", help="answer requests missing from the cassettes with 404")
+    parser.add_argument("--upstream", help="base URL requests are recorded from (defaults to the OpenAI API)")
+    args = parser.parse_args(argv)
+
+    stub = StubBackend(tuple(float(value) for value in args.verdicts.split(",")), args.seed)
+    latency = args.latency
+    if args.mode == "record":
+        if len(args.cassettes) != 1:
+            parser.error("record takes exactly one cassette")
+        backend = RecordBackend(args.cassettes[0], args.upstream)
+        latency = None
+    elif args.mode == "replay":
+        if not args.cassettes:
+            parser.error("replay takes at least one cassette")
+        backend = ReplayBackend(args.cassettes, fallback=None if args.strict else stub)
+    else:
+        backend = stub
+
+    server = start_server(backend, args.host, args.port, latency, args.chunk_delay, args.seed)
+    sys.stderr.write(f"{args.mode} server at {server.base_url} (set LLMEVAL_BASE_URL to use it)\n")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+Offline evaluation through the OpenAI Batch API.
+
+The JSA Advisor and both judge calls are single-shot completions, so a nightly sweep can send them
+as a Batch API job at half the price and outside the interactive rate limits. Dragonshield still runs
+interactively. A run goes through two batches:
+
+    python -m llmeval.offline prepare nightly --tasks tasks.jsonl --out advisor-requests.jsonl
+    python -m llmeval.offline submit advisor-requests.jsonl
+    python -m llmeval.offline fetch BATCH_ID --out advisor-results.jsonl
+    python -m llmeval.offline ingest advisor-results.jsonl
+
+    python -m llmeval.offline prepare nightly --out judge-requests.jsonl
+    (submit, fetch and ingest the judge batch the same way)
+
+    python -m llmeval.offline prepare nightly --out /dev/null
+
+The first prepare runs Dragonshield for every task and writes the advisor requests, the second writes
+the judge requests and the last one finishes the results, which are then in the result store like those
+of any other run. Instead of submit and fetch, `local` answers a request file through the normal call
+path and writes the result file the Batch API would have returned, for testing without a batch job.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai.types.chat import ChatCompletion
+
+from llmeval.batch import read_tasks
+from llmeval.cache import CACHE_BYPASS, CACHE_REFRESH, CACHE_USE
+from llmeval.context import CONTEXT_FULL, CONTEXT_PRUNED, DEFAULT_CONTEXT_BUDGET
+from llmeval.llm import MODEL, chat_completion, get_client
+from llmeval.pipeline import (
+    DEFAULT_MAX_FEEDBACK_ROUNDS,
+    JUDGE_COMPACT,
+    JUDGE_VERBOSE,
+    SPEAKERS_AUTO,
+    SPEAKERS_FIXED,
+    SPEAKERS_FSM,
+    StageDeferred,
+    completion_text,
+    evaluate_tasks,
+)
+from llmeval.store import get_store
+from llmeval.telemetry import record_call, tagged
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+def custom_id(run_id, task_index, stage, agent):
+    """Return the id that ties a batch request to its run, task and stage."""
+    return f"{run_id}:{task_index}:{stage}:{agent}"
+
+
+def parse_custom_id(request_id):
+    """Return the run id, task index, stage and agent of a batch request id."""
+    run_id, task_index, stage, agent = request_id.rsplit(":", 3)
+    return run_id, int(task_index), stage, agent
+
+
+def prepare(run_id, requests_path, api_key, tasks_path=None, concurrency=4, cache_mode=CACHE_USE, log=sys.stderr,
+            speaker_mode=SPEAKERS_AUTO, max_feedback_rounds=DEFAULT_MAX_FEEDBACK_ROUNDS, report_retries=1,
+            judge_mode=JUDGE_VERBOSE, context_mode=CONTEXT_FULL, context_budget=DEFAULT_CONTEXT_BUDGET):
+    """
+    Advances every unfinished task of a run to its next single-shot stage and writes the requests of
+    those stages to requests_path in Batch API format.
+    Tasks whose stages are all checkpointed get their results. Returns the number of requests written,
+    the number of tasks finished and the number that failed.
+    """
+    store = get_store()
+    run_id = store.new_run(run_id)
+    if tasks_path is not None:
+        for index, (_, task) in enumerate(read_tasks(tasks_path)):
+            store.add_task(run_id, index, task)
+    log.write(f"run {run_id}\n")
+
+    written = finished = failed = 0
+    lock = threading.Lock()
+    with open(requests_path, "w", encoding="utf-8") as out:
+
+        def defer(index, stage, agent, messages, params):
+            nonlocal written
+            line = {
+                "custom_id": custom_id(run_id, index, stage, agent),
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": dict(params, model=MODEL, messages=messages),
+            }
+            with lock:
+                out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                written += 1
+
+        evaluations = evaluate_tasks(store.pending_tasks(run_id), api_key, concurrency, cache_mode, store=store,
+                                     run_id=run_id, speaker_mode=speaker_mode, max_feedback_rounds=max_feedback_rounds,
+                                     report_retries=report_retries, defer=defer, judge_mode=judge_mode,
+                                     context_mode=context_mode, context_budget=context_budget)
+        for index, task, result, error in evaluations:
+            if error is None:
+                finished += 1
+            elif not isinstance(error, StageDeferred):
+                failed += 1
+                log.write(f"task {index} failed: {error}\n")
+
+    log.write(f"{written} requests written to {requests_path}, {finished} tasks finished, {failed} failed\n")
+    return written, finished, failed
+
+
+def ingest(results_path, log=sys.stderr):
+    """
+    Checkpoints the responses of a Batch API result file as the stages they were requested for.
+    Responses are billed at the batch price in the call telemetry; they have no interactive latency,
+    so their stage and call times are recorded as zero. Failed requests are left unanswered and are
+    requested again by the next prepare. Returns the number of responses ingested and failed.
+    """
+    store = get_store()
+    ingested = failed = 0
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            run_id, task_index, stage, agent = parse_custom_id(record["custom_id"])
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                failed += 1
+                log.write(f"{record['custom_id']} failed: {record.get('error') or response.get('body')}\n")
+                continue
+            completion = ChatCompletion.model_validate(response["body"])
+            store.put_stage(run_id, task_index, stage, completion_text(completion), 0.0)
+            with tagged(sink=store.put_call, run_id=run_id, task_index=task_index, stage=stage):
+                record_call(agent, completion.model, time.time(), 0.0, completion, cache_hit=False, batch=True)
+            ingested += 1
+
+    log.write(f"{ingested} responses ingested, {failed} failed\n")
+    return ingested, failed
+
+
+def run_local(requests_path, results_path, api_key, concurrency=4, cache_mode=CACHE_USE):
+    """
+    Stands in for the Batch API: answers every request of a request file through the normal call path
+    (response cache and rate limiter included) and writes a result file in Batch API output format.
+    """
+    with open(requests_path, encoding="utf-8") as f:
+        requests = [json.loads(line) for line in f if line.strip()]
+
+    def answer(request):
+        _, _, _, agent = parse_custom_id(request["custom_id"])
+        body = dict(request["body"])
+        messages = body.pop("messages")
+        try:
+            completion = chat_completion(api_key, messages, model=body.pop("model", MODEL),
+                                         temperature=body.pop("temperature", None), agent=agent,
+                                         cache_mode=cache_mode, **body)
+        except Exception as e:
+            return {"custom_id": request["custom_id"], "response": None,
+                    "error": {"code": type(e).__name__, "message": str(e)}}
+        return {"custom_id": request["custom_id"], "error": None,
+                "response": {"status_code": 200, "body": completion.model_dump()}}
+
+    with open(results_path, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for line_number, result in enumerate(executor.map(answer, requests), start=1):
+            out.write(json.dumps(dict(id=f"local_req_{line_number}", **result), ensure_ascii=False) + "\n")
+    return len(requests)
+
+
+def submit(requests_path, api_key):
+    """Uploads a request file and starts a Batch API job on it. Returns the id of the batch."""
+    client, _ = get_client(api_key)
+    with open(requests_path, "rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window="24h")
+    return batch.id
+
+
+def fetch(batch_id, results_path, api_key):
+    """
+    Downloads the results of a finished batch, including its failed requests, to results_path.
+    Returns the status of the batch; nothing is written until it is "completed".
+    """
+    client, _ = get_client(api_key)
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != "completed":
+        return batch.status
+    with open(results_path, "wb") as out:
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                out.write(client.files.content(file_id).read())
+    return batch.status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the advisor and judge stages of an evaluation as Batch API jobs.")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"),
+                        help="OpenAI API key (defaults to $OPENAI_API_KEY)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    prepare_parser = commands.add_parser("prepare", help="run Dragonshield and write the next batch of requests")
+    prepare_parser.add_argument("run_id", help="id of the run to create or continue")
+    prepare_parser.add_argument("--tasks", help="JSONL task file to add to the run")
+    prepare_parser.add_argument("--out", required=True, help="Batch API request file to write")
+    prepare_parser.add_argument("--concurrency", type=int, default=4, help="number of tasks run in parallel")
+    prepare_parser.add_argument("--cache", choices=[CACHE_USE, CACHE_REFRESH, CACHE_BYPASS], default=CACHE_USE,
+                                help="response cache mode for the Dragonshield chats")
+    prepare_parser.add_argument("--speakers", choices=[SPEAKERS_AUTO, SPEAKERS_FSM, SPEAKERS_FIXED],
+                                default=SPEAKERS_AUTO, help="Dragonshield speaker selection")
+    prepare_parser.add_argument("--max-feedback-rounds", type=int, default=DEFAULT_MAX_FEEDBACK_ROUNDS,
+                                help="Feedbacker turns before the chat moves on to RiskManagement")
+    prepare_parser.add_argument("--report-retries", type=int, default=1,
+                                help="times a Dragonshield chat without a report is run again before the task fails")
+    prepare_parser.add_argument("--judge", choices=[JUDGE_VERBOSE, JUDGE_COMPACT], default=JUDGE_VERBOSE,
+                                help="verbose judge explanations, or compact scores and verdicts")
+    prepare_parser.add_argument("--context", choices=[CONTEXT_FULL, CONTEXT_PRUNED], default=CONTEXT_FULL,
+                                help="Dragonshield group chat history per call")
+    prepare_parser.add_argument("--context-budget", type=int, default=DEFAULT_CONTEXT_BUDGET,
+                                help="history tokens per Dragonshield call with --context pruned")
+
+    ingest_parser = commands.add_parser("ingest", help="checkpoint the responses of a Batch API result file")
+    ingest_parser.add_argument("results", help="Batch API result file")
+
+    local_parser = commands.add_parser("local", help="answer a request file locally instead of submitting it")
+    local_parser.add_argument("requests", help="Batch API request file")
+    local_parser.add_argument("--out", required=True, help="result file to write")
+    local_parser.add_argument("--concurrency", type=int, default=4, help="number of requests sent in parallel")
+    local_parser.add_argument("--cache", choices=[CACHE_USE, CACHE_REFRESH, CACHE_BYPASS], default=CACHE_USE,
+                              help="response cache mode for the requests")
+
+    submit_parser = commands.add_parser("submit", help="upload a request file and start a Batch API job")
+    submit_parser.add_argument("requests", help="Batch API request file")
+
+    fetch_parser = commands.add_parser("fetch", help="download the result file of a finished batch")
+    fetch_parser.add_argument("batch_id", help="id printed by submit")
+    fetch_parser.add_argument("--out", required=True, help="result file to write")
+    args = parser.parse_args(argv)
+
+    if args.command != "ingest" and not args.api_key:
+        parser.error("an OpenAI API key is required (--api-key or $OPENAI_API_KEY)")
+
+    if args.command == "prepare":
+        _, _, failed = prepare(args.run_id, args.out, args.api_key, args.tasks, args.concurrency, args.cache,
+                               speaker_mode=args.speakers, max_feedback_rounds=args.max_feedback_rounds,
+                               report_retries=args.report_retries, judge_mode=args.judge,
+                               context_mode=args.context, context_budget=args.context_budget)
+        return 1 if failed else 0
+    if args.command == "ingest":
+        _, failed = ingest(args.results)
+        return 1 if failed else 0
+    if args.command == "local":
+        count = run_local(args.requests, args.out, args.api_key, args.concurrency, args.cache)
+        sys.stderr.write(f"{count} requests answered in {args.out}\n")
+        return 0
+    if args.command == "submit":
+        print(submit(args.requests, args.api_key))
+        return 0
+    status = fetch(args.batch_id, args.out, args.api_key)
+    sys.stderr.write(f"batch {args.batch_id}: {status}\n")
+    return 0 if status == "completed" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,534 @@
+import importlib
+import json
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+from llmeval.cache import CACHE_BYPASS, CACHE_REFRESH, CACHE_USE
+from llmeval.context import CONTEXT_FULL, DEFAULT_CONTEXT_BUDGET
+from llmeval.deadlines import Deadline, StageTimeout, deadline
+from llmeval.lazy import lazy_import
+from llmeval.llm import chat_completion
+from llmeval.prompts import (
+    COMPACT_JUDGE_PROMPT,
+    JSA_ADVISOR_PROMPT,
+    JUDGE_PROMPT,
+    VERDICT_TOOL,
+)
+from llmeval.telemetry import tagged
+
+# Imports autogen, which only the Dragonshield chat needs
+agents = lazy_import("llmeval.agents")
+
+# Verdicts of a single judge comparison
+DRAGONSHIELD = "Dragonshield"
+JSA_ADVISOR = "JSA Advisor"
+TIE = "Tie"
+
+# Final verdicts over both comparisons
+DRAGONSHIELD_WINNER = "Dragonshield (Multi-agent)"
+JSA_ADVISOR_WINNER = "JSA Advisor (Single-agent)"
+TIE_WINNER = "Tie or inconclusive"
+
+# How the group chat manager picks the next speaker
+SPEAKERS_AUTO = "auto"
+SPEAKERS_FSM = "fsm"
+SPEAKERS_FIXED = "fixed"
+SPEAKER_MODE_LABELS = {
+    "LLM-selected (every round)": SPEAKERS_AUTO,
+    "Fixed flow, LLM-selected feedback loop": SPEAKERS_FSM,
+    "Fixed flow, single feedback pass": SPEAKERS_FIXED,
+}
+
+# How the JSA Judge gives its verdict
+JUDGE_VERBOSE = "verbose"  # a detailed explanation with [[A]] or [[B]] in the text
+JUDGE_COMPACT = "compact"  # criterion scores, a verdict and a short rationale through the record_verdict function
+JUDGE_MODE_LABELS = {
+    "Verbose explanation": JUDGE_VERBOSE,
+    "Compact scores and verdict": JUDGE_COMPACT,
+}
+COMPACT_JUDGE_MAX_TOKENS = 400
+
+# Round budget of a Dragonshield chat; two feedback rounds still leave room for RiskManagement and the Reporter
+MAX_ROUND = 10
+DEFAULT_MAX_FEEDBACK_ROUNDS = 2
+
+# Seconds a task and each of its stages may take (None for no limit); both judge stages share "judge"
+DEFAULT_DEADLINES = {"task": None, "dragonshield": 900, "jsa_advisor": 300, "judge": 300}
+STAGE_DEADLINES = {"dragonshield": "dragonshield", "jsa_advisor": "jsa_advisor", "judge_1": "judge", "judge_2": "judge"}
+
+# Speaker flow defined by the agents' prompts:
+# ProjectManager -> SafetyInspector -> RiskAssessment <-> Feedbacker -> RiskManagement -> Reporter
+SPEAKER_FLOW = {
+    "Admin": ["ProjectManagerAgent"],
+    "ProjectManagerAgent": ["SafetyInspectorAgent"],
+    "SafetyInspectorAgent": ["RiskAssessmentAgent"],
+    "RiskAssessmentAgent": ["FeedbackerAgent"],
+    "FeedbackerAgent": ["RiskAssessmentAgent", "RiskManagementAgent"],
+    "RiskManagementAgent": ["ReporterAgent"],
+}
+
+
+def is_final_report(message):
+    """
+    A chat is over once the Reporter has written its report; run_dragonshield only uses the first one.
+    """
+    return message.get("name") == "ReporterAgent" and bool((message.get("content") or "").strip())
+
+
+def run_dragonshield(task, api_key, cache_mode=CACHE_USE, on_message=None, speaker_mode=SPEAKERS_AUTO, stats=None,
+                     max_feedback_rounds=DEFAULT_MAX_FEEDBACK_ROUNDS, context_mode=CONTEXT_FULL,
+                     context_budget=DEFAULT_CONTEXT_BUDGET):
+    """
+    Runs the Dragonshield group chat for a task and returns the ReporterAgent's report, or "" if it never reported.
+    on_message(agent, content) is called for every message as soon as its agent has spoken.
+    If a stats dict is given, it is filled with the rounds, speaker selections and token counts of the chat.
+    """
+    with agents.dragonshield_team(api_key, cache_mode, speaker_mode, max_feedback_rounds, context_mode,
+                                  context_budget) as team:
+        team.on_message = on_message
+        response = team.user_proxy.initiate_chat(
+            team.manager,
+            message=task,
+        )
+
+        groupchat = team.manager.groupchat
+        report_round = next((i for i, message in enumerate(groupchat.messages) if is_final_report(message)), None)
+        if stats is not None:
+            counts = groupchat.selection_counts
+            prompt_tokens, completion_tokens = agents.chat_tokens(groupchat.agents + [team.manager])
+            stats.update({
+                "speaker_mode": speaker_mode,
+                "context_mode": context_mode,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "rounds": len(groupchat.messages),
+                "reported": report_round is not None,
+                # Rounds after the report never reach the result
+                "rounds_after_report": len(groupchat.messages) - report_round - 1 if report_round is not None else 0,
+                "speaker_selections": counts["speaker_selections"],
+                "selector_calls": counts["selector_calls"],
+                # With LLM selection every speaker selection is an LLM call
+                "selector_calls_saved": counts["speaker_selections"] - counts["selector_calls"],
+            })
+
+        # Extract Dragonshield (multi-agent) response
+        for message in response.chat_history:
+            if message.get('name') == 'ReporterAgent':
+                return message.get('content')
+        return ""
+
+
+def dragonshield_report(task, api_key, cache_mode=CACHE_USE, on_message=None, speaker_mode=SPEAKERS_AUTO,
+                        stats=None, max_feedback_rounds=DEFAULT_MAX_FEEDBACK_ROUNDS, context_mode=CONTEXT_FULL,
+                        context_budget=DEFAULT_CONTEXT_BUDGET, report_retries=1):
+    """
+    Runs the Dragonshield group chat like run_dragonshield, running a chat that ended without a report again
+    up to report_retries times, and raises NoReportError if none of them reported.
+    If a stats dict is given, it is filled with the stats of the last chat plus the attempts, empty reports,
+    tokens and wasted rounds over all of them.
+    """
+    attempts = []
+    for attempt in range(report_retries + 1):
+        # A retry has to call the models again rather than replay the cached chat
+        attempt_cache_mode = cache_mode if attempt == 0 or cache_mode == CACHE_BYPASS else CACHE_REFRESH
+        attempt_stats = {}
+        report = run_dragonshield(task, api_key, attempt_cache_mode, on_message, speaker_mode, attempt_stats,
+                                  max_feedback_rounds, context_mode, context_budget)
+        attempts.append(attempt_stats)
+        if report:
+            break
+
+    if stats is not None:
+        stats.update(attempts[-1])
+        stats.update({
+            "report_attempts": len(attempts),
+            "empty_reports": sum(1 for attempt_stats in attempts if not attempt_stats["reported"]),
+            # Tokens spent on chats without a report count too
+            "prompt_tokens": sum(attempt_stats["prompt_tokens"] for attempt_stats in attempts),
+            "completion_tokens": sum(attempt_stats["completion_tokens"] for attempt_stats in attempts),
+            # Every round of a chat without a report is wasted, as are the rounds after a report
+            "wasted_rounds": sum(attempt_stats["rounds"] for attempt_stats in attempts[:-1])
+                             + (attempts[-1]["rounds_after_report"] if report else attempts[-1]["rounds"]),
+        })
+    if not report:
+        raise NoReportError(f"Dragonshield ended without a report after {len(attempts)} attempts")
+    return report
+
+
+def jsa_advisor_request(task):
+    """Return the agent name, messages and extra request parameters of the JSA Advisor call for a task."""
+    return "JSAAdvisor", [
+        {"role": "system", "content": JSA_ADVISOR_PROMPT},
+        {"role": "user", "content": task}
+    ], {}
+
+
+def judge_request(task, response_a, response_b, judge_mode=JUDGE_VERBOSE):
+    """
+    Return the agent name, messages and extra request parameters of a JSA Judge call comparing two responses
+    in the given order. The compact judge has to answer through the record_verdict function.
+    """
+    comparison = f"The task was: {task}\n\nResponse A:\n{response_a}\n\nResponse B:\n{response_b}"
+    if judge_mode == JUDGE_COMPACT:
+        return "JSAJudge", [
+            {"role": "system", "content": COMPACT_JUDGE_PROMPT},
+            {"role": "user", "content": comparison}
+        ], {
+            "tools": [VERDICT_TOOL],
+            "tool_choice": {"type": "function", "function": {"name": VERDICT_TOOL["function"]["name"]}},
+            "max_tokens": COMPACT_JUDGE_MAX_TOKENS,
+        }
+    return "JSAJudge", [
+        {"role": "system", "content": JUDGE_PROMPT},
+        {"role": "user", "content": comparison}
+    ], {}
+
+
+def completion_text(completion):
+    """
+    Returns the text of a completion; a function call is returned as its arguments in canonical JSON.
+    """
+    message = completion.choices[0].message
+    if message.tool_calls:
+        arguments = message.tool_calls[0].function.arguments
+        try:
+            return json.dumps(json.loads(arguments), ensure_ascii=False)
+        except ValueError:
+            return arguments
+    return message.content
+
+
+def run_jsa_advisor(task, api_key, cache_mode=CACHE_USE, on_token=None, hedge=False):
+    """
+    Runs the JSA Advisor (single-agent) analysis for a task.
+    With on_token, the analysis is streamed to it as it is generated.
+    With hedge, a call slower than the advisor's p95 is sent again (see llmeval.llm.hedged_call).
+    """
+    agent, messages, params = jsa_advisor_request(task)
+    jsa_advisor = chat_completion(api_key, messages, agent=agent, cache_mode=cache_mode, on_token=on_token,
+                                  hedge=hedge, **params)
+    return completion_text(jsa_advisor)
+
+
+def run_judge(task, response_a, response_b, api_key, cache_mode=CACHE_USE, on_token=None, judge_mode=JUDGE_VERBOSE,
+              hedge=False):
+    """
+    Asks the JSA Judge to compare two responses in the given order.
+    With on_token, the verdict is streamed to it as it is generated; the short compact verdict
+    is passed to it in one piece once it is complete.
+    With hedge, a call slower than the judge's p95 is sent again (see llmeval.llm.hedged_call).
+    """
+    agent, messages, params = judge_request(task, response_a, response_b, judge_mode)
+    stream = on_token if judge_mode == JUDGE_VERBOSE else None
+    jsa_judge = chat_completion(api_key, messages, agent=agent, cache_mode=cache_mode, on_token=stream, hedge=hedge,
+                                **params)
+    judge_response = completion_text(jsa_judge)
+    if on_token is not None and stream is None:
+        on_token(judge_response)
+    return judge_response
+
+
+def check_markers_in_content(response_text):
+    """
+    Checks if response contains markers [[A]] or [[B]].
+    """
+    a_exists = bool(re.search(r'\[\[A\]\]', response_text))
+    b_exists = bool(re.search(r'\[\[B\]\]', response_text))
+    return a_exists, b_exists
+
+
+def compact_verdict(judge_response):
+    """Return the record_verdict arguments of a compact judge response, or None for a verbose one."""
+    try:
+        verdict = json.loads(judge_response)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(verdict, dict) or verdict.get("verdict") not in ("A", "B", "tie"):
+        return None
+    return verdict
+
+
+def run_winner(judge_response, system_a, system_b):
+    """
+    Returns the system a judge preferred in one comparison.
+    A compact verdict is read exactly; a verbose response is a "Tie" unless exactly one marker is present.
+    """
+    verdict = compact_verdict(judge_response)
+    if verdict is not None:
+        return {"A": system_a, "B": system_b}.get(verdict["verdict"], TIE)
+    a_exists, b_exists = check_markers_in_content(judge_response)
+    if a_exists and not b_exists:
+        return system_a
+    if b_exists and not a_exists:
+        return system_b
+    return TIE
+
+
+def final_winner(first_run_winner, second_run_winner):
+    """
+    Returns the overall winner: a system has to win both comparisons.
+    """
+    if first_run_winner == second_run_winner == JSA_ADVISOR:
+        return JSA_ADVISOR_WINNER
+    if first_run_winner == second_run_winner == DRAGONSHIELD:
+        return DRAGONSHIELD_WINNER
+    return TIE_WINNER
+
+
+class NoReportError(RuntimeError):
+    """Raised when Dragonshield ends without a report, so the task is not sent to the judges."""
+
+
+class StageDeferred(Exception):
+    """Raised when a task stops at a stage whose request was handed to an offline batch."""
+
+
+def run_jsa_evaluation(task, api_key, cache_mode=CACHE_USE, checkpoint=None, on_event=None, speaker_mode=SPEAKERS_AUTO,
+                       max_feedback_rounds=DEFAULT_MAX_FEEDBACK_ROUNDS, report_retries=1, defer=None,
+                       judge_mode=JUDGE_VERBOSE, context_mode=CONTEXT_FULL, context_budget=DEFAULT_CONTEXT_BUDGET,
+                       deadlines=None, hedge=False, cancel=None):
+    """
+    Runs Dragonshield, JSA Advisor and both judge comparisons for one task.
+    It doesn't touch Streamlit, so it can run in worker threads and from the batch CLI.
+    With a checkpoint, every stage is saved as soon as it finishes and stages saved by an
+    earlier, interrupted run are reused instead of being run again.
+    on_event(kind, source, text) receives live progress: ("message", agent, content) for every
+    Dragonshield message and ("token", stage, text) for streamed advisor and judge output; a
+    ("message", stage, text) from a stage replaces the text it streamed so far.
+    Streaming doesn't change the stored responses or the measured times.
+    speaker_mode selects how the Dragonshield group chat picks its speakers (see llmeval.agents.speaker_transitions).
+    A Dragonshield chat that ends without a report is run again up to report_retries times; if it still
+    has no report, NoReportError is raised before either judge is called.
+    judge_mode selects the verbose or the compact structured judge (see judge_request), and context_mode
+    how much of the group chat history each Dragonshield call sees (see llmeval.context).
+    With defer (which needs a checkpoint), the single-shot advisor and judge stages are not called here:
+    defer(stage, agent, messages, params) receives the request of each one that has no checkpoint yet and the task
+    stops with StageDeferred. Dragonshield still runs interactively. Once the responses are checkpointed
+    (see llmeval.offline), running the task again picks up from the next stage.
+    deadlines overrides DEFAULT_DEADLINES: a stage still running when its deadline or the task's passes
+    stops at its next model call or streamed token with StageTimeout, which is checkpointed as the "timeout"
+    stage (a resumed run tries the stage again). Setting the cancel event stops the task the same way
+    with TaskCancelled. With hedge, the advisor and judge calls are hedged (see llmeval.llm.hedged_call).
+    """
+    # Every model call of a checkpointed task is recorded with its run, task and stage
+    call_tags = {}
+    if checkpoint is not None:
+        call_tags = {"sink": checkpoint.put_call, "run_id": checkpoint.run_id, "task_index": checkpoint.task_index}
+
+    limits = dict(DEFAULT_DEADLINES, **(deadlines or {}))
+    task_deadline = Deadline("task", limits["task"], cancel)
+
+    # Run a pipeline stage under its deadline and measure how long it took
+    def stage(name, run_stage, *args, **kwargs):
+        if checkpoint is not None:
+            saved = checkpoint.get(name)
+            if saved is not None:
+                return saved
+        stage_start_time = time.time()
+        try:
+            with tagged(stage=name, **call_tags), deadline(name, limits[STAGE_DEADLINES[name]], parent=task_deadline):
+                output = run_stage(*args, **kwargs)
+        except StageTimeout as e:
+            # When the task's deadline passed, the timeout is reported against the stage that was running
+            timeout = e if e.stage == name else StageTimeout(name, e.seconds, e.deadline)
+            if checkpoint is not None:
+                checkpoint.put("timeout", json.dumps({"stage": name, "deadline": timeout.deadline,
+                                                      "seconds": timeout.seconds}), time.time() - stage_start_time)
+            if timeout is e:
+                raise
+            raise timeout from e
+        elapsed = time.time() - stage_start_time
+        if checkpoint is not None:
+            checkpoint.put(name, output, elapsed)
+        return output, elapsed
+
+    # In offline mode, a single-shot stage without a checkpoint is handed to defer instead of being run
+    def single_shot(name, request, run_stage, *args, **kwargs):
+        if defer is not None and checkpoint.get(name) is None:
+            defer(name, *request)
+            raise StageDeferred(f"{name} was deferred to an offline batch")
+        return stage(name, run_stage, *args, **kwargs)
+
+    # Live progress callbacks for each stage
+    on_message = None
+    if on_event is not None:
+        def on_message(agent, content):
+            on_event("message", agent, content)
+
+    def tokens(source):
+        if on_event is None:
+            return None
+        # A hedged call replaces the partial stream with the full text of the request that won
+        return lambda text, replace=False: on_event("message" if replace else "token", source, text)
+
+    # Dragonshield's chat statistics are checkpointed next to its report
+    dragonshield_stats = {}
+
+    def dragonshield(on_message):
+        try:
+            return dragonshield_report(task, api_key, cache_mode, on_message, speaker_mode, dragonshield_stats,
+                                       max_feedback_rounds, context_mode, context_budget, report_retries)
+        finally:
+            # Saved for chats without a report too, so their wasted tokens and rounds are kept
+            if checkpoint is not None and dragonshield_stats:
+                checkpoint.put("dragonshield_stats", json.dumps(dragonshield_stats), 0.0)
+
+    # Start the conversation
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        # Dragonshield and JSA Advisor don't depend on each other, so they run at the same time
+        dragonshield_future = executor.submit(stage, "dragonshield", dragonshield, on_message)
+        jsa_advisor_future = executor.submit(single_shot, "jsa_advisor", jsa_advisor_request(task), run_jsa_advisor,
+                                             task, api_key, cache_mode, on_token=tokens("JSA Advisor"), hedge=hedge)
+        dragonshield_response, multi_agent_time = dragonshield_future.result()
+        jsa_advisor_response, single_agent_time = jsa_advisor_future.result()
+        if not dragonshield_stats and checkpoint is not None:
+            saved_stats = checkpoint.get("dragonshield_stats")
+            if saved_stats is not None:
+                dragonshield_stats = json.loads(saved_stats[0])
+
+        # Both judge orderings only need the two responses, so they also run together
+        # (the swapped run is there for a fair comparison)
+        judge_future = executor.submit(single_shot, "judge_1",
+                                       judge_request(task, jsa_advisor_response, dragonshield_response, judge_mode),
+                                       run_judge, task, jsa_advisor_response, dragonshield_response, api_key,
+                                       cache_mode, on_token=tokens("Judge 1"), judge_mode=judge_mode, hedge=hedge)
+        judge_swapped_future = executor.submit(single_shot, "judge_2",
+                                               judge_request(task, dragonshield_response, jsa_advisor_response,
+                                                             judge_mode),
+                                               run_judge, task, dragonshield_response, jsa_advisor_response, api_key,
+                                               cache_mode, on_token=tokens("Judge 2"), judge_mode=judge_mode,
+                                               hedge=hedge)
+        judge_response, first_judge_time = judge_future.result()
+        judge_response_swapped, second_judge_time = judge_swapped_future.result()
+
+    # Times come from the stage checkpoints, so a resumed task keeps the times of the stages it skipped;
+    # stages that run at the same time take as long as the slower of them
+    judge_time = max(first_judge_time, second_judge_time)
+    total_time = max(multi_agent_time, single_agent_time) + judge_time
+
+    # Check which system was preferred in each comparison (JSA Advisor is A in the first, B in the second)
+    first_run_winner = run_winner(judge_response, JSA_ADVISOR, DRAGONSHIELD)
+    second_run_winner = run_winner(judge_response_swapped, DRAGONSHIELD, JSA_ADVISOR)
+
+    # Determine the final winner
+    winner = final_winner(first_run_winner, second_run_winner)
+
+    # Prepare results
+    results = {
+        "Task": task,
+        "Dragonshield Response": dragonshield_response,
+        "JSA Advisor Response": jsa_advisor_response,
+        "Judge Response 1": judge_response,
+        "Judge Response 2": judge_response_swapped,
+        "Run 1 Winner": first_run_winner,
+        "Run 2 Winner": second_run_winner,
+        "Winner": winner,
+        "Dragonshield Time": f"{multi_agent_time:.2f}s",
+        "JSA Advisor Time": f"{single_agent_time:.2f}s",
+        "Judge Time": f"{judge_time:.2f}s",
+        "Total Time": f"{total_time:.2f}s",
+        "Dragonshield Seconds": round(multi_agent_time, 3),
+        "JSA Advisor Seconds": round(single_agent_time, 3),
+        "Judge Seconds": round(judge_time, 3),
+        "Total Seconds": round(total_time, 3),
+        "Judge Mode": judge_mode,
+        "Speaker Mode": dragonshield_stats.get("speaker_mode", speaker_mode),
+        "Context Mode": dragonshield_stats.get("context_mode", context_mode),
+        "Dragonshield Prompt Tokens": dragonshield_stats.get("prompt_tokens"),
+        "Dragonshield Completion Tokens": dragonshield_stats.get("completion_tokens"),
+        "Dragonshield Rounds": dragonshield_stats.get("rounds"),
+        "Speaker Selections": dragonshield_stats.get("speaker_selections"),
+        "Selector Calls": dragonshield_stats.get("selector_calls"),
+        "Selector Calls Saved": dragonshield_stats.get("selector_calls_saved"),
+        "Report Attempts": dragonshield_stats.get("report_attempts"),
+        "Empty Reports": dragonshield_stats.get("empty_reports"),
+        "Wasted Rounds": dragonshield_stats.get("wasted_rounds"),
+    }
+
+    if checkpoint is not None:
+        checkpoint.put_result(results)
+    return results
+
+
+def evaluate_tasks(tasks, api_key, max_workers=4, cache_mode=CACHE_USE, store=None, run_id=None, on_event=None,
+                   speaker_mode=SPEAKERS_AUTO, max_feedback_rounds=DEFAULT_MAX_FEEDBACK_ROUNDS, report_retries=1,
+                   defer=None, judge_mode=JUDGE_VERBOSE, context_mode=CONTEXT_FULL,
+                   context_budget=DEFAULT_CONTEXT_BUDGET, deadlines=None, hedge=False, cancel=None):
+    """
+    Evaluates (index, task) pairs with bounded concurrency and yields (index, task, result, error)
+    as each one finishes. Tasks are pulled from the iterable lazily, so at most max_workers tasks
+    are held in memory at a time.
+    With a store, tasks are recorded under run_id, every stage is checkpointed, and tasks that
+    already have a result in that run are skipped.
+    on_event(index, kind, source, text) receives the live progress of every task (see run_jsa_evaluation);
+    it is called from worker threads.
+    defer(index, stage, agent, messages, params) switches to offline mode (see run_jsa_evaluation); it needs a store,
+    and tasks that stop at a deferred stage are yielded with a StageDeferred error.
+    deadlines, hedge and cancel apply to every task (see run_jsa_evaluation); a task that runs out of time is
+    yielded with a StageTimeout error, and once cancel is set the running tasks stop with TaskCancelled.
+    """
+    tasks = iter(tasks)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+
+        def submit_next():
+            # A cancelled batch starts no more tasks
+            if cancel is not None and cancel.is_set():
+                return
+            for index, task in tasks:
+                checkpoint = None
+                if store is not None:
+                    store.add_task(run_id, index, task)
+                    if store.has_result(run_id, index):
+                        continue
+                    checkpoint = store.checkpoint(run_id, index)
+                task_events = partial(on_event, index) if on_event is not None else None
+                task_defer = partial(defer, index) if defer is not None else None
+                future = executor.submit(run_jsa_evaluation, task, api_key, cache_mode, checkpoint, task_events,
+                                         speaker_mode, max_feedback_rounds, report_retries, task_defer, judge_mode,
+                                         context_mode, context_budget, deadlines, hedge, cancel)
+                pending[future] = (index, task)
+                return
+
+        for _ in range(max_workers):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, task = pending.pop(future)
+                # Keep the pool full before handing the result back
+                submit_next()
+                try:
+                    yield index, task, future.result(), None
+                except Exception as e:
+                    yield index, task, None, e
+
+
+# Imported ahead of the first evaluation: the Dragonshield agents (autogen), the OpenAI SDK and pandas for the results
+WARM_UP_MODULES = ["llmeval.agents", "openai", "pandas"]
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+
+def _import_modules(names):
+    for name in names:
+        importlib.import_module(name)
+
+
+def warm_up():
+    """
+    Starts importing the dependencies of the first evaluation in a background thread, once per process,
+    so a page can render without them and still have them loaded by the time a task is submitted.
+    Returns the thread.
+    """
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=_import_modules, args=(WARM_UP_MODULES,),
+                                               name="llmeval-warm-up", daemon=True)
+            _warm_up_thread.start()
+        return _warm_up_thread
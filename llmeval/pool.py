@@ -0,0 +1,198 @@
+"""
+Pre-generated comparison pool for the human evaluator.
+
+    python -m llmeval.pool tasks.jsonl --concurrency 4
+
+Generates a Dragonshield and a JSA Advisor response for every task in the file (same format as
+llmeval.batch) that has no pair in the pool yet, and stores each pair in the result store as soon as
+both responses are in. The human evaluator serves raters the next pair they haven't seen from the pool,
+so a vote no longer waits for both systems. The same producer can be started from the page.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llmeval.batch import read_tasks
+from llmeval.cache import CACHE_BYPASS, CACHE_REFRESH, CACHE_USE
+from llmeval.context import CONTEXT_FULL, CONTEXT_PRUNED
+from llmeval.pipeline import (
+    DRAGONSHIELD_WINNER,
+    JSA_ADVISOR_WINNER,
+    SPEAKERS_AUTO,
+    SPEAKERS_FIXED,
+    SPEAKERS_FSM,
+    dragonshield_report,
+    run_jsa_advisor,
+)
+from llmeval.store import get_store
+
+
+def generate_pair(task, api_key, cache_mode=CACHE_USE, speaker_mode=SPEAKERS_AUTO, context_mode=CONTEXT_FULL,
+                  report_retries=1):
+    """
+    Runs Dragonshield and the JSA Advisor side by side for a task and returns both responses.
+    A Dragonshield chat that ends without a report is run again up to report_retries times.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        jsa_advisor_future = executor.submit(run_jsa_advisor, task, api_key, cache_mode)
+        dragonshield_response = dragonshield_report(task, api_key, cache_mode, speaker_mode=speaker_mode,
+                                                    context_mode=context_mode, report_retries=report_retries)
+        return dragonshield_response, jsa_advisor_future.result()
+
+
+def fill_pool(tasks, api_key, concurrency=2, cache_mode=CACHE_USE, speaker_mode=SPEAKERS_AUTO,
+              context_mode=CONTEXT_FULL, store=None, stop=None):
+    """
+    Generates a pair for every task that has none in the pool yet, with bounded concurrency, and yields
+    (task, pair_id, error) as each one finishes. No new task is started once the stop event is set.
+    """
+    store = store or get_store()
+    tasks = iter(tasks)
+    submitted = set()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = {}
+
+        def submit_next():
+            for task in tasks:
+                if stop is not None and stop.is_set():
+                    return
+                # A task listed twice is generated once
+                if task in submitted or store.has_pair(task, speaker_mode, context_mode):
+                    continue
+                submitted.add(task)
+                future = executor.submit(generate_pair, task, api_key, cache_mode, speaker_mode, context_mode)
+                pending[future] = task
+                return
+
+        for _ in range(concurrency):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = pending.pop(future)
+                submit_next()
+                try:
+                    dragonshield_response, jsa_advisor_response = future.result()
+                except Exception as e:
+                    yield task, None, e
+                    continue
+                yield task, store.put_pair(task, speaker_mode, context_mode, dragonshield_response,
+                                           jsa_advisor_response), None
+
+
+def serve_pair(rater, store=None):
+    """
+    Returns the next pair of the pool the rater hasn't voted on, with the two responses placed at random in
+    slots A and B, or None once the rater has voted on every pair.
+    """
+    row = (store or get_store()).next_pair(rater)
+    if row is None:
+        return None
+    pair_id, task, speaker_mode, context_mode, dragonshield_response, jsa_advisor_response = row
+    slots = [(DRAGONSHIELD_WINNER, dragonshield_response), (JSA_ADVISOR_WINNER, jsa_advisor_response)]
+    random.shuffle(slots)
+    return {
+        "pair_id": pair_id,
+        "task": task,
+        "speaker_mode": speaker_mode,
+        "context_mode": context_mode,
+        "mapping": {slot: {"response": response, "model": model} for slot, (model, response) in zip("AB", slots)},
+    }
+
+
+class PoolProducer:
+    """
+    Background thread that fills the comparison pool, shared by every session of the process,
+    so a fill keeps going when the browser that started it is closed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.progress = {"total": 0, "generated": 0, "failed": 0, "last_error": None, "started": None}
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, tasks, api_key, concurrency=2, cache_mode=CACHE_USE, speaker_mode=SPEAKERS_AUTO,
+              context_mode=CONTEXT_FULL):
+        """Start filling the pool from a list of tasks; returns False if a fill is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self._stop.clear()
+            self.progress = {"total": len(tasks), "generated": 0, "failed": 0, "last_error": None,
+                             "started": time.time()}
+            self._thread = threading.Thread(
+                target=self._fill, args=(tasks, api_key, concurrency, cache_mode, speaker_mode, context_mode),
+                name="llmeval-pool", daemon=True,
+            )
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """Let the pairs being generated finish, but start no new ones."""
+        self._stop.set()
+
+    def _fill(self, tasks, api_key, concurrency, cache_mode, speaker_mode, context_mode):
+        pairs = fill_pool(tasks, api_key, concurrency, cache_mode, speaker_mode, context_mode, stop=self._stop)
+        for task, pair_id, error in pairs:
+            if error is None:
+                self.progress["generated"] += 1
+            else:
+                self.progress["failed"] += 1
+                self.progress["last_error"] = f"{task}: {error}"
+
+
+_producer = None
+_producer_lock = threading.Lock()
+
+
+def get_producer():
+    """Return the process-wide pool producer."""
+    global _producer
+    with _producer_lock:
+        if _producer is None:
+            _producer = PoolProducer()
+        return _producer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill the human evaluator's comparison pool from a JSONL task file.")
+    parser.add_argument("tasks", help="JSONL file with one task per line")
+    parser.add_argument("--concurrency", type=int, default=2, help="number of pairs generated in parallel")
+    parser.add_argument("--cache", choices=[CACHE_USE, CACHE_REFRESH, CACHE_BYPASS], default=CACHE_USE,
+                        help="response cache mode for the generation")
+    parser.add_argument("--speakers", choices=[SPEAKERS_AUTO, SPEAKERS_FSM, SPEAKERS_FIXED], default=SPEAKERS_AUTO,
+                        help="Dragonshield speaker selection (see llmeval.batch)")
+    parser.add_argument("--context", choices=[CONTEXT_FULL, CONTEXT_PRUNED], default=CONTEXT_FULL,
+                        help="Dragonshield group chat context (see llmeval.batch)")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"),
+                        help="OpenAI API key (defaults to $OPENAI_API_KEY)")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("an OpenAI API key is required (--api-key or $OPENAI_API_KEY)")
+
+    generated = failed = 0
+    tasks = (task for _, task in read_tasks(args.tasks))
+    for task, pair_id, error in fill_pool(tasks, args.api_key, args.concurrency, args.cache, args.speakers,
+                                          args.context):
+        if error is None:
+            generated += 1
+            sys.stderr.write(f"[{generated + failed}] {task}: pair {pair_id}\n")
+        else:
+            failed += 1
+            sys.stderr.write(f"[{generated + failed}] {task}: failed: {error}\n")
+    sys.stderr.write(f"{generated} pairs added, {failed} failed\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
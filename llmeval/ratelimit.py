@@ -0,0 +1,99 @@
+import os
+import random
+import threading
+import time
+
+from llmeval.deadlines import CHECK_INTERVAL
+
+DEFAULT_REQUESTS_PER_MINUTE = int(os.environ.get("LLMEVAL_REQUESTS_PER_MINUTE", "500"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.environ.get("LLMEVAL_TOKENS_PER_MINUTE", "300000"))
+
+# Completion length assumed when reserving token budget before a call
+EXPECTED_COMPLETION_TOKENS = 1000
+
+
+def estimate_tokens(messages):
+    """
+    Returns a rough token count for a message list (about four characters per token).
+    """
+    return sum(len(str(message.get("content") or "")) // 4 + 4 for message in messages)
+
+
+def backoff_delay(attempt, base=1.0, maximum=60.0):
+    """Exponential backoff with full jitter for the given retry attempt."""
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+class RateLimiter:
+    """
+    Token-bucket governor for one API key.
+    Callers reserve one request and an estimated number of tokens before each call
+    and block until both buckets have room, so concurrent tasks share one budget.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = 0
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens, deadline=None):
+        """
+        Block until a request with the estimated number of tokens fits in the budget.
+        With a deadline (see llmeval.deadlines), stop waiting once it passes or is cancelled.
+        """
+        tokens = min(tokens, self.tokens_per_minute)
+        with self._condition:
+            self._waiting += 1
+            try:
+                while True:
+                    if deadline is not None:
+                        deadline.check()
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now >= self._paused_until and self._requests >= 1 and self._tokens >= tokens:
+                        self._requests -= 1
+                        self._tokens -= tokens
+                        self._in_flight += 1
+                        return
+                    # Sleep until the scarcer bucket (or a backoff pause) allows another request
+                    wait = max(
+                        self._paused_until - now,
+                        (1 - self._requests) * 60 / self.requests_per_minute,
+                        (tokens - self._tokens) * 60 / self.tokens_per_minute,
+                        0.01,
+                    )
+                    if deadline is not None:
+                        wait = min(wait, CHECK_INTERVAL)
+                    self._condition.wait(wait)
+            finally:
+                self._waiting -= 1
+
+    def release(self, reserved_tokens, used_tokens=None):
+        """Finish a request, returning unused reserved tokens or charging any overrun."""
+        with self._condition:
+            self._in_flight -= 1
+            if used_tokens is not None:
+                self._tokens = min(self.tokens_per_minute, self._tokens + reserved_tokens - used_tokens)
+            self._condition.notify_all()
+
+    def pause(self, seconds):
+        """Hold back every caller for the given time, e.g. after a 429 from the provider."""
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def queue_depth(self):
+        """Return the number of requests waiting for budget and the number in flight."""
+        with self._condition:
+            return {"waiting": self._waiting, "in_flight": self._in_flight}
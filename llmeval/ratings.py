@@ -0,0 +1,242 @@
+import threading
+
+from llmeval.lazy import lazy_import
+from llmeval.pipeline import DRAGONSHIELD, DRAGONSHIELD_WINNER, JSA_ADVISOR, JSA_ADVISOR_WINNER, TIE
+from llmeval.summary import summary_record
+from llmeval.votes import VOTE_A, VOTE_B
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+SOURCE_JUDGE = "LLM judge"
+SOURCE_HUMAN = "Human"
+SOURCE_ALL = "All verdicts"
+
+# Outcome of a comparison for its first system
+OUTCOME_WIN = 0
+OUTCOME_LOSS = 1
+OUTCOME_TIE = 2
+
+# Bradley–Terry strengths are shown on the Elo scale: a 400 point gap is 10:1 odds
+ELO_BASE = 1000
+ELO_SCALE = 400
+# Virtual tied games between every pair of systems, so a system that never won still has a finite rating
+PRIOR_TIES = 1.0
+BOOTSTRAP_SAMPLES = 200
+CONFIDENCE = 0.95
+
+# Human votes name the systems by their display labels
+SYSTEM_LABELS = {DRAGONSHIELD_WINNER: DRAGONSHIELD, JSA_ADVISOR_WINNER: JSA_ADVISOR}
+
+LEADERBOARD_COLUMNS = ["System", "Rating", "CI Low", "CI High", "Wins", "Losses", "Ties", "Comparisons"]
+
+
+def fit_bradley_terry(wins, init=None, max_iterations=500, tolerance=1e-9):
+    """
+    Returns the Bradley–Terry strengths for wins[..., i, j], the games system i won against system j
+    with ties counted as half a win for each, scaled to a geometric mean of 1.
+    Fitted by minorization-maximization; leading dimensions are independent fits, all run at once.
+    init warm-starts the fit, so a refit after a few more comparisons takes a few iterations.
+    """
+    n = wins.shape[-1]
+    if n < 2:
+        return np.ones(wins.shape[:-1])
+    wins = wins + PRIOR_TIES / 2 * (1 - np.eye(n))
+    games = wins + np.swapaxes(wins, -1, -2)
+    total_wins = wins.sum(axis=-1)
+    strengths = np.ones(wins.shape[:-1]) if init is None else np.broadcast_to(init, wins.shape[:-1]).copy()
+    for _ in range(max_iterations):
+        updated = total_wins / (games / (strengths[..., :, None] + strengths[..., None, :])).sum(axis=-1)
+        updated /= np.exp(np.log(updated).mean(axis=-1, keepdims=True))
+        converged = np.abs(updated - strengths).max() < tolerance
+        strengths = updated
+        if converged:
+            break
+    return strengths
+
+
+def elo(strengths):
+    """Return Bradley–Terry strengths on the Elo scale."""
+    return ELO_BASE + ELO_SCALE * np.log10(strengths)
+
+
+class PairwiseRatings:
+    """
+    Bradley–Terry ratings of systems from pairwise comparisons.
+    Comparisons are kept as counts per (system, system, outcome), so adding one is O(1) and a refit
+    costs the same at a hundred comparisons and at a million. Bootstrap intervals resample the
+    comparisons through those counts.
+    """
+
+    def __init__(self, systems=()):
+        self.systems = []
+        self._index = {}
+        # counts[i, j, outcome] for i < j, outcome for system i
+        self.counts = np.zeros((0, 0, 3))
+        self._strengths = None
+        self._leaderboard = None
+        for name in systems:
+            self._system(name)
+
+    @property
+    def comparisons(self):
+        return int(self.counts.sum())
+
+    def _system(self, name):
+        if name not in self._index:
+            self._index[name] = len(self.systems)
+            self.systems.append(name)
+            self.counts = np.pad(self.counts, ((0, 1), (0, 1), (0, 0)))
+            if self._strengths is not None:
+                self._strengths = np.append(self._strengths, 1.0)
+        return self._index[name]
+
+    def add_many(self, comparisons):
+        """Add (system_a, system_b, outcome for system_a) comparisons."""
+        comparisons = list(comparisons)
+        if not comparisons:
+            return
+        first = np.array([self._system(a) for a, _, _ in comparisons])
+        second = np.array([self._system(b) for _, b, _ in comparisons])
+        outcomes = np.array([outcome for _, _, outcome in comparisons])
+        # Store every pair in (lower index, higher index) order, flipping wins and losses to match
+        swapped = first > second
+        low, high = np.where(swapped, second, first), np.where(swapped, first, second)
+        outcomes = np.where(swapped & (outcomes != OUTCOME_TIE), 1 - outcomes, outcomes)
+        np.add.at(self.counts, (low, high, outcomes), 1)
+        self._leaderboard = None
+
+    def add(self, system_a, system_b, outcome):
+        self.add_many([(system_a, system_b, outcome)])
+
+    @staticmethod
+    def _wins(counts):
+        """Return wins[..., i, j] from counts[..., i, j, outcome]."""
+        ties = counts[..., OUTCOME_TIE] / 2
+        return (counts[..., OUTCOME_WIN] + np.swapaxes(counts[..., OUTCOME_LOSS], -1, -2)
+                + ties + np.swapaxes(ties, -1, -2))
+
+    def fit(self):
+        """Return the Bradley–Terry strengths of the systems, warm-started from the previous fit."""
+        self._strengths = fit_bradley_terry(self._wins(self.counts), init=self._strengths)
+        return self._strengths
+
+    def bootstrap(self, samples=BOOTSTRAP_SAMPLES, seed=0):
+        """
+        Returns the strengths fitted to samples bootstrap resamples of the comparisons, one row each.
+        A resample of the comparisons is a multinomial draw over the count cells, so all of them are
+        drawn and fitted in one go.
+        """
+        total = self.comparisons
+        rng = np.random.default_rng(seed)
+        cells = rng.multinomial(total, self.counts.ravel() / total, size=samples)
+        return fit_bradley_terry(self._wins(cells.reshape((samples,) + self.counts.shape)).astype(float),
+                                 init=self._strengths)
+
+    def leaderboard(self):
+        """
+        Returns the systems with their Elo-scale rating, its bootstrap confidence interval and their record,
+        best first. It is only recomputed after comparisons were added.
+        """
+        if self._leaderboard is None:
+            if not self.comparisons:
+                self._leaderboard = pd.DataFrame(columns=LEADERBOARD_COLUMNS)
+                return self._leaderboard
+            ratings = elo(self.fit())
+            low, high = np.percentile(elo(self.bootstrap()), [(1 - CONFIDENCE) / 2 * 100, (1 + CONFIDENCE) / 2 * 100],
+                                      axis=0)
+            counts = self.counts
+            wins = counts[..., OUTCOME_WIN].sum(axis=1) + counts[..., OUTCOME_LOSS].sum(axis=0)
+            losses = counts[..., OUTCOME_LOSS].sum(axis=1) + counts[..., OUTCOME_WIN].sum(axis=0)
+            ties = counts[..., OUTCOME_TIE].sum(axis=1) + counts[..., OUTCOME_TIE].sum(axis=0)
+            frame = pd.DataFrame({
+                "System": self.systems,
+                "Rating": ratings,
+                "CI Low": low,
+                "CI High": high,
+                "Wins": wins.astype(int),
+                "Losses": losses.astype(int),
+                "Ties": ties.astype(int),
+                "Comparisons": (wins + losses + ties).astype(int),
+            }, columns=LEADERBOARD_COLUMNS)
+            self._leaderboard = frame.sort_values("Rating", ascending=False, ignore_index=True)
+        return self._leaderboard
+
+
+def judge_comparisons(result):
+    """
+    Returns the two judge comparisons of a result, one per ordering of the responses, as
+    (Dragonshield, JSA Advisor, outcome for Dragonshield). An inconclusive judgement counts as a tie.
+    """
+    record = summary_record(result)
+    outcomes = {DRAGONSHIELD: OUTCOME_WIN, JSA_ADVISOR: OUTCOME_LOSS, TIE: OUTCOME_TIE}
+    return [(DRAGONSHIELD, JSA_ADVISOR, outcomes[record[run]]) for run in ("Run 1 Winner", "Run 2 Winner")]
+
+
+def tournament_comparison(system_a, system_b, winner):
+    """Returns a tournament judgement as (system A, system B, outcome for A)."""
+    return system_a, system_b, {system_a: OUTCOME_WIN, system_b: OUTCOME_LOSS}.get(winner, OUTCOME_TIE)
+
+
+def vote_comparison(vote):
+    """Returns a human vote as (system A, system B, outcome for A); "both bad" counts as a tie."""
+    outcome = {VOTE_A: OUTCOME_WIN, VOTE_B: OUTCOME_LOSS}.get(vote["choice"], OUTCOME_TIE)
+    return SYSTEM_LABELS.get(vote["model_a"], vote["model_a"]), SYSTEM_LABELS.get(vote["model_b"], vote["model_b"]), outcome
+
+
+class RatingEngine:
+    """
+    Ratings over every judge verdict in the result store (evaluation runs and tournaments) and every
+    human vote, per source and combined.
+    Each update only reads the results and votes saved since the previous one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ratings = {SOURCE_JUDGE: PairwiseRatings(), SOURCE_HUMAN: PairwiseRatings(), SOURCE_ALL: PairwiseRatings()}
+        self._last_result = 0
+        self._last_comparison = 0
+        self._last_vote = 0
+
+    def update(self, store=None, vote_store=None):
+        """Add the verdicts of the results and the votes saved since the last update."""
+        with self._lock:
+            if store is not None:
+                comparisons = []
+                for rowid, result in store.iter_results_after(self._last_result):
+                    comparisons.extend(judge_comparisons(result))
+                    self._last_result = rowid
+                for rowid, system_a, system_b, winner in store.comparisons_after(self._last_comparison):
+                    comparisons.append(tournament_comparison(system_a, system_b, winner))
+                    self._last_comparison = rowid
+                self.ratings[SOURCE_JUDGE].add_many(comparisons)
+                self.ratings[SOURCE_ALL].add_many(comparisons)
+            if vote_store is not None:
+                comparisons = []
+                for vote in vote_store.iter_votes(after=self._last_vote):
+                    comparisons.append(vote_comparison(vote))
+                    self._last_vote = vote["vote_id"]
+                self.ratings[SOURCE_HUMAN].add_many(comparisons)
+                self.ratings[SOURCE_ALL].add_many(comparisons)
+
+    def leaderboard(self, sources=(SOURCE_ALL, SOURCE_JUDGE, SOURCE_HUMAN)):
+        """Returns the leaderboards of the given sources stacked, with a Source column, skipping empty ones."""
+        with self._lock:
+            frames = [self.ratings[source].leaderboard().assign(Source=source) for source in sources
+                      if self.ratings[source].comparisons]
+        if not frames:
+            return pd.DataFrame(columns=["Source"] + LEADERBOARD_COLUMNS)
+        return pd.concat(frames, ignore_index=True)[["Source"] + LEADERBOARD_COLUMNS]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_rating_engine():
+    """Return the process-wide rating engine."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RatingEngine()
+        return _engine
@@ -0,0 +1,374 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from llmeval.telemetry import CALL_COLUMNS
+
+DEFAULT_RESULTS_PATH = os.environ.get("LLMEVAL_RESULTS_PATH", os.path.join(".llmeval", "results.sqlite"))
+
+# What a run is: an evaluation (llmeval.pipeline) or a tournament (llmeval.tournament)
+RUN_EVALUATION = "evaluation"
+RUN_TOURNAMENT = "tournament"
+
+
+class ResultStore:
+    """
+    Durable store for evaluation runs.
+    Every finished stage and every finished task is written as soon as it completes,
+    so a crashed or interrupted run can be resumed from the first missing stage.
+    """
+
+    def __init__(self, path=DEFAULT_RESULTS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY, created REAL NOT NULL, kind TEXT NOT NULL DEFAULT 'evaluation');
+            CREATE TABLE IF NOT EXISTS tasks (
+                run_id TEXT NOT NULL, task_index INTEGER NOT NULL, task TEXT NOT NULL,
+                PRIMARY KEY (run_id, task_index));
+            CREATE TABLE IF NOT EXISTS stages (
+                run_id TEXT NOT NULL, task_index INTEGER NOT NULL, stage TEXT NOT NULL,
+                output TEXT NOT NULL, elapsed REAL NOT NULL, completed REAL NOT NULL,
+                PRIMARY KEY (run_id, task_index, stage));
+            CREATE TABLE IF NOT EXISTS calls (
+                run_id TEXT NOT NULL, task_index INTEGER NOT NULL, stage TEXT, agent TEXT, model TEXT,
+                started REAL NOT NULL, wall_seconds REAL NOT NULL, ttft_seconds REAL,
+                prompt_tokens INTEGER, completion_tokens INTEGER, cached_tokens INTEGER,
+                retries INTEGER, cost REAL, cache_hit INTEGER);
+            CREATE INDEX IF NOT EXISTS calls_by_run ON calls (run_id);
+            CREATE TABLE IF NOT EXISTS results (
+                run_id TEXT NOT NULL, task_index INTEGER NOT NULL, result TEXT NOT NULL, completed REAL NOT NULL,
+                PRIMARY KEY (run_id, task_index));
+            CREATE TABLE IF NOT EXISTS comparisons (
+                run_id TEXT NOT NULL, task_index INTEGER NOT NULL, system_a TEXT NOT NULL, system_b TEXT NOT NULL,
+                winner TEXT NOT NULL, completed REAL NOT NULL,
+                PRIMARY KEY (run_id, task_index, system_a, system_b));
+            CREATE TABLE IF NOT EXISTS pairs (
+                pair_id TEXT PRIMARY KEY, task TEXT NOT NULL, speaker_mode TEXT NOT NULL, context_mode TEXT NOT NULL,
+                dragonshield TEXT NOT NULL, jsa_advisor TEXT NOT NULL, created REAL NOT NULL,
+                UNIQUE (task, speaker_mode, context_mode));
+            CREATE TABLE IF NOT EXISTS pair_views (
+                rater TEXT NOT NULL, pair_id TEXT NOT NULL, served REAL NOT NULL, voted REAL,
+                PRIMARY KEY (rater, pair_id));
+            CREATE INDEX IF NOT EXISTS pair_views_by_pair ON pair_views (pair_id);
+            """
+        )
+        # Stores created before runs had a kind: only tournaments have comparisons
+        if "kind" not in [row[1] for row in self._conn.execute("PRAGMA table_info(runs)")]:
+            self._conn.execute("ALTER TABLE runs ADD COLUMN kind TEXT NOT NULL DEFAULT 'evaluation'")
+            self._conn.execute("UPDATE runs SET kind = ? WHERE run_id IN (SELECT run_id FROM comparisons)",
+                               (RUN_TOURNAMENT,))
+        # Stores created before views recorded the vote: those pairs count as voted on, as they did before
+        if "voted" not in [row[1] for row in self._conn.execute("PRAGMA table_info(pair_views)")]:
+            self._conn.execute("ALTER TABLE pair_views ADD COLUMN voted REAL")
+            self._conn.execute("UPDATE pair_views SET voted = served")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def new_run(self, run_id=None, kind=RUN_EVALUATION):
+        """Create a run of the given kind and return its id."""
+        run_id = run_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        self._execute("INSERT OR IGNORE INTO runs (run_id, created, kind) VALUES (?, ?, ?)",
+                      (run_id, time.time(), kind))
+        return run_id
+
+    def add_task(self, run_id, task_index, task):
+        """Register a task of a run; re-adding the same index on resume is a no-op."""
+        self._execute("INSERT OR IGNORE INTO tasks (run_id, task_index, task) VALUES (?, ?, ?)", (run_id, task_index, task))
+
+    def runs(self, kind=RUN_EVALUATION):
+        """
+        Return (run_id, created, task count, completed count) for every run of a kind, newest first.
+        Tournaments have no results, so they are left out of the evaluation runs.
+        """
+        return self._execute(
+            "SELECT r.run_id, r.created, "
+            "(SELECT COUNT(*) FROM tasks t WHERE t.run_id = r.run_id), "
+            "(SELECT COUNT(*) FROM results s WHERE s.run_id = r.run_id) "
+            "FROM runs r WHERE r.kind = ? ORDER BY r.created DESC",
+            (kind,),
+        )
+
+    def tasks(self, run_id):
+        """Return the tasks of a run in order."""
+        rows = self._execute("SELECT task FROM tasks WHERE run_id = ? ORDER BY task_index", (run_id,))
+        return [row[0] for row in rows]
+
+    def pending_tasks(self, run_id):
+        """Return (index, task) for every task of a run that has no result yet."""
+        return self._execute(
+            "SELECT t.task_index, t.task FROM tasks t LEFT JOIN results r "
+            "ON r.run_id = t.run_id AND r.task_index = t.task_index "
+            "WHERE t.run_id = ? AND r.task_index IS NULL ORDER BY t.task_index",
+            (run_id,),
+        )
+
+    def timeouts(self, run_ids):
+        """
+        Returns (run_id, task_index, task, stage, deadline, seconds) for every task of the given runs whose last
+        attempt timed out (see run_jsa_evaluation) and that has no result since. deadline is the stage itself
+        or "task" when the deadline of the whole task passed.
+        """
+        if not run_ids:
+            return []
+        placeholders = ", ".join("?" * len(run_ids))
+        rows = self._execute(
+            "SELECT s.run_id, s.task_index, t.task, s.output FROM stages s "
+            "JOIN tasks t ON t.run_id = s.run_id AND t.task_index = s.task_index "
+            "LEFT JOIN results r ON r.run_id = s.run_id AND r.task_index = s.task_index "
+            f"WHERE s.stage = 'timeout' AND r.task_index IS NULL AND s.run_id IN ({placeholders}) "
+            "ORDER BY s.run_id, s.task_index",
+            tuple(run_ids),
+        )
+        timeouts = []
+        for run_id, task_index, task, output in rows:
+            timeout = json.loads(output)
+            timeouts.append((run_id, task_index, task, timeout["stage"], timeout["deadline"], timeout["seconds"]))
+        return timeouts
+
+    def get_stage(self, run_id, task_index, stage):
+        """Return (output, elapsed) of a completed stage, or None."""
+        rows = self._execute(
+            "SELECT output, elapsed FROM stages WHERE run_id = ? AND task_index = ? AND stage = ?",
+            (run_id, task_index, stage),
+        )
+        return rows[0] if rows else None
+
+    def put_stage(self, run_id, task_index, stage, output, elapsed):
+        self._execute(
+            "INSERT OR REPLACE INTO stages (run_id, task_index, stage, output, elapsed, completed) VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, task_index, stage, output, elapsed, time.time()),
+        )
+
+    def put_result(self, run_id, task_index, result):
+        self._execute(
+            "INSERT OR REPLACE INTO results (run_id, task_index, result, completed) VALUES (?, ?, ?, ?)",
+            (run_id, task_index, json.dumps(result, ensure_ascii=False), time.time()),
+        )
+
+    def has_result(self, run_id, task_index):
+        return bool(self._execute(
+            "SELECT 1 FROM results WHERE run_id = ? AND task_index = ?", (run_id, task_index)
+        ))
+
+    def count_results(self, run_ids):
+        """Return the number of finished tasks over the given runs."""
+        if not run_ids:
+            return 0
+        placeholders = ", ".join("?" * len(run_ids))
+        return self._execute(f"SELECT COUNT(*) FROM results WHERE run_id IN ({placeholders})", tuple(run_ids))[0][0]
+
+    def results_version(self, run_ids):
+        """
+        Return a token that changes whenever a result of the given runs is added, replaced or deleted.
+        """
+        if not run_ids:
+            return "0-0"
+        placeholders = ", ".join("?" * len(run_ids))
+        count, last_completed = self._execute(
+            f"SELECT COUNT(*), MAX(completed) FROM results WHERE run_id IN ({placeholders})", tuple(run_ids)
+        )[0]
+        return f"{count}-{int((last_completed or 0) * 1000)}"
+
+    def iter_results(self, run_ids):
+        """
+        Yields the results of the given runs, run by run and in task order, without loading them all at once.
+        """
+        for run_id in run_ids:
+            with self._lock:
+                cursor = self._conn.execute(
+                    "SELECT result FROM results WHERE run_id = ? ORDER BY task_index", (run_id,)
+                )
+                rows = cursor.fetchmany(256)
+            while rows:
+                for row in rows:
+                    yield json.loads(row[0])
+                with self._lock:
+                    rows = cursor.fetchmany(256)
+
+    def iter_results_after(self, rowid=0):
+        """
+        Yields (rowid, result) for the results of every run saved after rowid, in the order they were saved,
+        so a reader can pick up only what is new since its last pass.
+        """
+        with self._lock:
+            cursor = self._conn.execute("SELECT rowid, result FROM results WHERE rowid > ? ORDER BY rowid", (rowid,))
+            rows = cursor.fetchmany(256)
+        while rows:
+            for row in rows:
+                yield row[0], json.loads(row[1])
+            with self._lock:
+                rows = cursor.fetchmany(256)
+
+    def put_call(self, record):
+        """Save the telemetry record of one model call (see llmeval.telemetry)."""
+        self._execute(
+            f"INSERT INTO calls ({', '.join(CALL_COLUMNS)}) VALUES ({', '.join('?' * len(CALL_COLUMNS))})",
+            tuple(record.get(column) for column in CALL_COLUMNS),
+        )
+
+    def calls_version(self, run_ids):
+        """Return a token that changes whenever a call of the given runs is recorded or deleted."""
+        if not run_ids:
+            return "0-0"
+        placeholders = ", ".join("?" * len(run_ids))
+        count, last_started = self._execute(
+            f"SELECT COUNT(*), MAX(started) FROM calls WHERE run_id IN ({placeholders})", tuple(run_ids)
+        )[0]
+        return f"{count}-{int((last_started or 0) * 1000)}"
+
+    def iter_calls(self, run_ids):
+        """
+        Yields the call records of the given runs as dicts, run by run and in the order they started.
+        """
+        for run_id in run_ids:
+            with self._lock:
+                cursor = self._conn.execute(
+                    f"SELECT {', '.join(CALL_COLUMNS)} FROM calls WHERE run_id = ? ORDER BY started", (run_id,)
+                )
+                rows = cursor.fetchmany(256)
+            while rows:
+                for row in rows:
+                    record = dict(zip(CALL_COLUMNS, row))
+                    record["cache_hit"] = bool(record["cache_hit"])
+                    yield record
+                with self._lock:
+                    rows = cursor.fetchmany(256)
+
+    def put_comparison(self, run_id, task_index, system_a, system_b, winner):
+        """Save a tournament judgement: system_a's response was shown as A, winner is a system or "Tie"."""
+        self._execute(
+            "INSERT OR REPLACE INTO comparisons (run_id, task_index, system_a, system_b, winner, completed) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, task_index, system_a, system_b, winner, time.time()),
+        )
+
+    def comparisons(self, run_id):
+        """Return (task_index, system_a, system_b, winner) for every tournament judgement of a run."""
+        return self._execute(
+            "SELECT task_index, system_a, system_b, winner FROM comparisons WHERE run_id = ? ORDER BY rowid", (run_id,)
+        )
+
+    def comparisons_after(self, rowid=0):
+        """Return (rowid, system_a, system_b, winner) for the tournament judgements of every run saved after rowid."""
+        return self._execute(
+            "SELECT rowid, system_a, system_b, winner FROM comparisons WHERE rowid > ? ORDER BY rowid", (rowid,)
+        )
+
+    def has_pair(self, task, speaker_mode, context_mode):
+        """Return whether the comparison pool already has a pair for a task generated with these modes."""
+        return bool(self._execute(
+            "SELECT 1 FROM pairs WHERE task = ? AND speaker_mode = ? AND context_mode = ?",
+            (task, speaker_mode, context_mode),
+        ))
+
+    def put_pair(self, task, speaker_mode, context_mode, dragonshield, jsa_advisor):
+        """Add a pair of responses to the comparison pool and return its id."""
+        pair_id = uuid.uuid4().hex[:12]
+        self._execute(
+            "INSERT OR REPLACE INTO pairs (pair_id, task, speaker_mode, context_mode, dragonshield, jsa_advisor, created) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (pair_id, task, speaker_mode, context_mode, dragonshield, jsa_advisor, time.time()),
+        )
+        return pair_id
+
+    def pool_counts(self, rater):
+        """Return the number of pairs in the comparison pool and how many of them the rater hasn't voted on."""
+        return self._execute(
+            "SELECT COUNT(*), COUNT(*) - (SELECT COUNT(*) FROM pair_views WHERE rater = ? AND voted IS NOT NULL) "
+            "FROM pairs",
+            (rater,),
+        )[0]
+
+    def next_pair(self, rater):
+        """
+        Return (pair_id, task, speaker_mode, context_mode, dragonshield, jsa_advisor) of a pair the rater hasn't
+        voted on, or None once they have voted on them all.
+        A pair served to the rater without a vote (the page was refreshed, or they asked for the next one first)
+        is served again; otherwise a new one is marked served, the pairs served least often first, so votes
+        spread evenly over the pool.
+        """
+        columns = "p.pair_id, p.task, p.speaker_mode, p.context_mode, p.dragonshield, p.jsa_advisor"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM pairs p JOIN pair_views v ON v.pair_id = p.pair_id "
+                "WHERE v.rater = ? AND v.voted IS NULL ORDER BY v.served LIMIT 1",
+                (rater,),
+            ).fetchall()
+            if rows:
+                return rows[0]
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM pairs p "
+                "WHERE NOT EXISTS (SELECT 1 FROM pair_views v WHERE v.rater = ? AND v.pair_id = p.pair_id) "
+                "ORDER BY (SELECT COUNT(*) FROM pair_views v WHERE v.pair_id = p.pair_id), RANDOM() LIMIT 1",
+                (rater,),
+            ).fetchall()
+            if not rows:
+                return None
+            self._conn.execute(
+                "INSERT INTO pair_views (rater, pair_id, served) VALUES (?, ?, ?)", (rater, rows[0][0], time.time())
+            )
+            return rows[0]
+
+    def mark_pair_voted(self, rater, pair_id):
+        """Record that the rater voted on a pair of the pool, so it isn't served to them again."""
+        self._execute(
+            "INSERT INTO pair_views (rater, pair_id, served, voted) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (rater, pair_id) DO UPDATE SET voted = excluded.voted",
+            (rater, pair_id, time.time(), time.time()),
+        )
+
+    def checkpoint(self, run_id, task_index):
+        """Return the stage checkpoint of one task."""
+        return TaskCheckpoint(self, run_id, task_index)
+
+    def delete_run(self, run_id):
+        with self._lock:
+            for table in ("runs", "tasks", "stages", "calls", "results", "comparisons"):
+                self._conn.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+
+
+class TaskCheckpoint:
+    """Completed stages of one task in a run."""
+
+    def __init__(self, store, run_id, task_index):
+        self.store = store
+        self.run_id = run_id
+        self.task_index = task_index
+
+    def get(self, stage):
+        return self.store.get_stage(self.run_id, self.task_index, stage)
+
+    def put(self, stage, output, elapsed):
+        self.store.put_stage(self.run_id, self.task_index, stage, output, elapsed)
+
+    def put_result(self, result):
+        self.store.put_result(self.run_id, self.task_index, result)
+
+    def put_call(self, record):
+        self.store.put_call(record)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide result store, opening it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore()
+        return _store
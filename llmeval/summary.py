@@ -0,0 +1,118 @@
+from llmeval.context import CONTEXT_FULL
+from llmeval.lazy import lazy_import
+from llmeval.pipeline import (
+    DRAGONSHIELD,
+    DRAGONSHIELD_WINNER,
+    JSA_ADVISOR,
+    JSA_ADVISOR_WINNER,
+    TIE,
+    TIE_WINNER,
+    run_winner,
+)
+from llmeval.telemetry import CALL_COLUMNS
+
+pd = lazy_import("pandas")
+
+RUN_VERDICTS = [DRAGONSHIELD, JSA_ADVISOR, TIE]
+FINAL_VERDICTS = [DRAGONSHIELD_WINNER, JSA_ADVISOR_WINNER, TIE_WINNER]
+
+# Typed timing columns and the display strings they replace in older results
+TIMING_COLUMNS = {
+    "Dragonshield Seconds": "Dragonshield Time",
+    "JSA Advisor Seconds": "JSA Advisor Time",
+    "Judge Seconds": "Judge Time",
+    "Total Seconds": "Total Time",
+}
+# Dragonshield chat counts (missing in results saved before they were recorded)
+CHAT_COLUMNS = ["Speaker Selections", "Selector Calls", "Selector Calls Saved", "Report Attempts", "Empty Reports",
+                "Wasted Rounds", "Dragonshield Prompt Tokens", "Dragonshield Completion Tokens"]
+SUMMARY_COLUMNS = (["Task", "Run 1 Winner", "Run 2 Winner", "Winner", "Context Mode"] + list(TIMING_COLUMNS)
+                   + CHAT_COLUMNS)
+
+
+def summary_record(result):
+    """
+    Returns the short, typed fields of a result that the summary is built from.
+    Results saved before verdicts were parsed at evaluation time are parsed here instead.
+    """
+    record = {column: result.get(column) for column in SUMMARY_COLUMNS}
+    if record["Run 1 Winner"] is None:
+        record["Run 1 Winner"] = run_winner(result["Judge Response 1"], JSA_ADVISOR, DRAGONSHIELD)
+        record["Run 2 Winner"] = run_winner(result["Judge Response 2"], DRAGONSHIELD, JSA_ADVISOR)
+    for seconds, label in TIMING_COLUMNS.items():
+        if record[seconds] is None and result.get(label):
+            record[seconds] = float(result[label].rstrip("s"))
+    # Every chat saw its full history before the context could be pruned
+    record["Context Mode"] = record["Context Mode"] or CONTEXT_FULL
+    return record
+
+
+def results_frame(results):
+    """
+    Builds one columnar table of verdicts and timings from results, leaving the long response texts out.
+    """
+    frame = pd.DataFrame([summary_record(result) for result in results], columns=SUMMARY_COLUMNS)
+    frame["Run 1 Winner"] = pd.Categorical(frame["Run 1 Winner"], categories=RUN_VERDICTS)
+    frame["Run 2 Winner"] = pd.Categorical(frame["Run 2 Winner"], categories=RUN_VERDICTS)
+    frame["Winner"] = pd.Categorical(frame["Winner"], categories=FINAL_VERDICTS)
+    numeric_columns = list(TIMING_COLUMNS) + CHAT_COLUMNS
+    frame[numeric_columns] = frame[numeric_columns].astype(float)
+    return frame
+
+
+def win_counts(frame):
+    """Return the number of final wins per verdict, including verdicts with no wins."""
+    return frame["Winner"].value_counts(sort=False)
+
+
+def comparison_breakdown(frame):
+    """Return how often each system won each of the two judge comparisons."""
+    return pd.DataFrame({
+        "Run 1 (JSA Advisor as A)": frame["Run 1 Winner"].value_counts(sort=False),
+        "Run 2 (Dragonshield as A)": frame["Run 2 Winner"].value_counts(sort=False),
+    })
+
+
+def timing_by_winner(frame):
+    """Return the mean stage timings in seconds, grouped by final verdict."""
+    return frame.groupby("Winner", observed=False)[list(TIMING_COLUMNS)].mean()
+
+
+def context_comparison(frame):
+    """Return the number of tasks, mean Dragonshield tokens and mean stage timings per context mode."""
+    grouped = frame.groupby("Context Mode")
+    comparison = grouped[["Dragonshield Prompt Tokens", "Dragonshield Completion Tokens", "Dragonshield Seconds",
+                          "Total Seconds"]].mean()
+    comparison.insert(0, "Tasks", grouped.size())
+    return comparison
+
+
+def calls_frame(calls):
+    """Builds one columnar table from per-call telemetry records."""
+    frame = pd.DataFrame(list(calls), columns=CALL_COLUMNS)
+    numeric_columns = ["wall_seconds", "ttft_seconds", "prompt_tokens", "completion_tokens", "cached_tokens",
+                       "retries", "cost"]
+    frame[numeric_columns] = frame[numeric_columns].astype(float)
+    frame["cache_hit"] = frame["cache_hit"].astype(bool)
+    return frame
+
+
+def agent_breakdown(calls):
+    """
+    Return calls, latency, tokens and estimated cost per stage and agent, slowest agents first.
+    The group chat manager's calls are its speaker selections.
+    """
+    breakdown = calls.groupby(["stage", "agent"]).agg(
+        calls=("wall_seconds", "size"),
+        cache_hits=("cache_hit", "sum"),
+        total_seconds=("wall_seconds", "sum"),
+        mean_seconds=("wall_seconds", "mean"),
+        mean_ttft_seconds=("ttft_seconds", "mean"),
+        prompt_tokens=("prompt_tokens", "sum"),
+        completion_tokens=("completion_tokens", "sum"),
+        cached_tokens=("cached_tokens", "sum"),
+        retries=("retries", "sum"),
+        cost=("cost", "sum"),
+    )
+    breakdown["share_of_time"] = breakdown["total_seconds"] / breakdown["total_seconds"].sum()
+    return breakdown.sort_values("total_seconds", ascending=False)
@@ -0,0 +1,40 @@
+from functools import partial
+
+from llmeval.cache import CACHE_USE
+from llmeval.context import CONTEXT_FULL, CONTEXT_PRUNED
+from llmeval.pipeline import (
+    DRAGONSHIELD,
+    JSA_ADVISOR,
+    SPEAKERS_AUTO,
+    SPEAKERS_FIXED,
+    dragonshield_report,
+    run_jsa_advisor,
+)
+
+# Systems a tournament can compare, by name: generate(task, api_key, cache_mode) returns the system's report
+SYSTEMS = {}
+
+
+def register_system(name, generate):
+    """
+    Register a system under a name. Any prompt, model or agent roster can take part in a tournament
+    as long as generate(task, api_key, cache_mode) returns its JSA report.
+    """
+    SYSTEMS[name] = generate
+
+
+def dragonshield_system(task, api_key, cache_mode=CACHE_USE, speaker_mode=SPEAKERS_AUTO, context_mode=CONTEXT_FULL,
+                        report_retries=1):
+    """Return the Dragonshield report of a task, running a chat that ended without one again."""
+    return dragonshield_report(task, api_key, cache_mode, speaker_mode=speaker_mode, context_mode=context_mode,
+                               report_retries=report_retries)
+
+
+def jsa_advisor_system(task, api_key, cache_mode=CACHE_USE):
+    return run_jsa_advisor(task, api_key, cache_mode)
+
+
+register_system(DRAGONSHIELD, dragonshield_system)
+register_system(JSA_ADVISOR, jsa_advisor_system)
+register_system(f"{DRAGONSHIELD} (fixed flow)", partial(dragonshield_system, speaker_mode=SPEAKERS_FIXED))
+register_system(f"{DRAGONSHIELD} (pruned context)", partial(dragonshield_system, context_mode=CONTEXT_PRUNED))
@@ -0,0 +1,79 @@
+import contextvars
+from contextlib import contextmanager
+
+# USD per million tokens (input, output)
+MODEL_PRICES = {
+    "gpt-4-1106-preview": (10.0, 30.0),
+}
+# Share of the input price charged for prompt tokens served from the provider's prompt cache
+CACHED_INPUT_PRICE = 0.5
+# Share of the price charged for requests sent through the Batch API
+BATCH_PRICE = 0.5
+
+CALL_COLUMNS = ["run_id", "task_index", "stage", "agent", "model", "started", "wall_seconds", "ttft_seconds",
+                "prompt_tokens", "completion_tokens", "cached_tokens", "retries", "cost", "cache_hit"]
+
+_tags = contextvars.ContextVar("llmeval_call_tags", default={})
+
+
+@contextmanager
+def tagged(**tags):
+    """
+    Tags every call recorded inside the block, on top of the tags of enclosing blocks.
+    A "sink" tag is the callable that receives each call record; without one nothing is recorded.
+    """
+    token = _tags.set(dict(_tags.get(), **tags))
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def usage_counts(usage):
+    """Return the prompt, completion and cached prompt tokens of a completion's usage."""
+    if usage is None:
+        return 0, 0, 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        cached = details.get("cached_tokens") or 0
+    else:
+        cached = getattr(details, "cached_tokens", None) or 0
+    return usage.prompt_tokens, usage.completion_tokens, cached
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0, batch=False):
+    """Return the estimated price of a call in USD, or None for a model without a known price."""
+    if model not in MODEL_PRICES:
+        return None
+    input_price, output_price = MODEL_PRICES[model]
+    billed_input = prompt_tokens - cached_tokens + cached_tokens * CACHED_INPUT_PRICE
+    cost = (billed_input * input_price + completion_tokens * output_price) / 1e6
+    return cost * BATCH_PRICE if batch else cost
+
+
+def record_call(agent, model, started, wall_seconds, completion, cache_hit, ttft_seconds=None, retries=0,
+                batch=False):
+    """
+    Sends the record of one chat completion to the sink of the current tags.
+    Responses served from the response cache cost nothing; batch responses are billed at BATCH_PRICE.
+    """
+    tags = _tags.get()
+    sink = tags.get("sink")
+    if sink is None:
+        return
+    prompt_tokens, completion_tokens, cached_tokens = usage_counts(completion.usage)
+    record = {key: value for key, value in tags.items() if key != "sink"}
+    record.update({
+        "agent": agent,
+        "model": model,
+        "started": started,
+        "wall_seconds": wall_seconds,
+        "ttft_seconds": ttft_seconds,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "retries": retries,
+        "cost": 0.0 if cache_hit else estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens, batch),
+        "cache_hit": cache_hit,
+    })
+    sink(record)
@@ -0,0 +1,256 @@
+"""
+Tournament between N registered systems that judges only the comparisons the ranking still needs.
+
+    python -m llmeval.tournament tasks.jsonl --systems "Dragonshield" "JSA Advisor" "Dragonshield (fixed flow)"
+
+Comparing every ordered pair of N systems on every task takes N·(N-1) judge calls per task. Instead,
+the tournament runs in rounds: each round judges the pairs whose order in the ranking is least
+certain, across all pairs and not only neighbours in the ranking (a system plays at most once per pass),
+on the task that pair has been judged on least and in the position that pair has been shown in least. It
+stops once every pair of neighbours in the ranking has been judged at least --min-comparisons times
+and each one's order holds in at least --confidence of the bootstrap resamples, or when --budget judge
+calls have been made.
+
+A system's response to a task is only generated the first time a comparison needs it. Responses and
+judgements are saved in the result store under the run id, so --run-id resumes a tournament, and
+the judgements join the LLM evaluator's ratings. Systems are registered in llmeval.systems.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from llmeval.batch import read_tasks
+from llmeval.cache import CACHE_BYPASS, CACHE_REFRESH, CACHE_USE
+from llmeval.pipeline import JUDGE_COMPACT, JUDGE_VERBOSE, run_judge, run_winner
+from llmeval.ratings import CONFIDENCE, PairwiseRatings, tournament_comparison
+from llmeval.store import RUN_TOURNAMENT, get_store
+from llmeval.systems import SYSTEMS
+from llmeval.telemetry import tagged
+
+DEFAULT_MIN_COMPARISONS = 5
+
+
+class TournamentScheduler:
+    """
+    Chooses the next comparisons of a tournament from the Bradley–Terry ratings of the judgements so far,
+    and decides when the ranking is settled.
+    """
+
+    def __init__(self, systems, task_count, confidence=CONFIDENCE, min_comparisons=DEFAULT_MIN_COMPARISONS, seed=0):
+        self.systems = list(systems)
+        self.task_count = task_count
+        self.confidence = confidence
+        self.min_comparisons = min_comparisons
+        self.ratings = PairwiseRatings(self.systems)
+        self.rng = np.random.default_rng(seed)
+        # (task_index, system_a, system_b) of every comparison judged or given up on, with A and B in shown order
+        self.judged = set()
+        self._pair_tasks = Counter()
+        self._pair_positions = Counter()
+
+    def record(self, task_index, system_a, system_b, winner=None):
+        """Record a judgement; without a winner the comparison failed and is not tried again."""
+        self.judged.add((task_index, system_a, system_b))
+        pair = frozenset((system_a, system_b))
+        self._pair_tasks[pair, task_index] += 1
+        self._pair_positions[system_a, system_b] += 1
+        if winner is not None:
+            self.ratings.add(*tournament_comparison(system_a, system_b, winner))
+
+    def order_probabilities(self):
+        """
+        Returns the fitted strengths and above[i, j], the share of bootstrap resamples in which system i
+        is rated above system j (0.5 for every pair before the first judgement).
+        """
+        n = len(self.systems)
+        if not self.ratings.comparisons:
+            return np.ones(n), np.full((n, n), 0.5)
+        strengths = self.ratings.fit()
+        samples = self.ratings.bootstrap()
+        return strengths, (samples[:, :, None] > samples[:, None, :]).mean(axis=0)
+
+    def settled(self):
+        """Return whether every pair of neighbours in the ranking is judged often enough and in a certain order."""
+        strengths, above = self.order_probabilities()
+        games = self._games()
+        ranking = np.argsort(-strengths)
+        for i, j in zip(ranking, ranking[1:]):
+            if games[i, j] < self.min_comparisons or above[i, j] < self.confidence:
+                return False
+        return True
+
+    def _games(self):
+        counts = self.ratings.counts.sum(axis=-1)
+        return counts + counts.T
+
+    def _next_comparison(self, system_a, system_b):
+        """Return the unjudged (task_index, A, B) of a pair on its least judged task, in its least shown order."""
+        pair = frozenset((system_a, system_b))
+        candidates = [(self._pair_tasks[pair, task_index], self._pair_positions[first, second], self.rng.random(),
+                       task_index, first, second)
+                      for task_index in range(self.task_count)
+                      for first, second in ((system_a, system_b), (system_b, system_a))
+                      if (task_index, first, second) not in self.judged]
+        if not candidates:
+            return None
+        return min(candidates)[3:]
+
+    def next_round(self, size):
+        """
+        Returns up to size comparisons to judge next, as (task_index, system_a, system_b).
+        Pairs are taken most uncertain first, then least judged; within a pass every system plays at most
+        once, and further passes fill the round from the same order.
+        """
+        strengths, above = self.order_probabilities()
+        games = self._games()
+        n = len(self.systems)
+        # How likely the pair's order is to flip: 0.5 when a coin toss, 0 when settled
+        order = sorted((-min(above[i, j], above[j, i]), games[i, j], self.rng.random(), i, j)
+                       for i in range(n) for j in range(i + 1, n))
+        picks = []
+        planned = set()
+        while len(picks) < size:
+            busy = set()
+            added = False
+            for _, _, _, i, j in order:
+                if len(picks) == size:
+                    break
+                if i in busy or j in busy:
+                    continue
+                comparison = self._next_comparison(self.systems[i], self.systems[j])
+                if comparison is None:
+                    continue
+                # Plan it as judged, so the next pass picks another task or order for the pair
+                self.judged.add(comparison)
+                planned.add(comparison)
+                picks.append(comparison)
+                busy.update((i, j))
+                added = True
+            if not added:
+                break
+        self.judged -= planned
+        return picks
+
+
+def run_tournament(tasks, systems, api_key, concurrency=4, cache_mode=CACHE_USE, judge_mode=JUDGE_COMPACT,
+                   budget=None, confidence=CONFIDENCE, min_comparisons=DEFAULT_MIN_COMPARISONS, store=None,
+                   run_id=None, log=sys.stderr, seed=0):
+    """
+    Runs a tournament between the named systems over tasks and returns (run_id, scheduler).
+    budget caps the judge calls of the run, including those of an earlier attempt it resumes.
+    """
+    store = store or get_store()
+    run_id = store.new_run(run_id, RUN_TOURNAMENT)
+    log.write(f"run {run_id}\n")
+    tasks = list(tasks)
+    for task_index, task in enumerate(tasks):
+        store.add_task(run_id, task_index, task)
+    scheduler = TournamentScheduler(systems, len(tasks), confidence, min_comparisons, seed)
+    for task_index, system_a, system_b, winner in store.comparisons(run_id):
+        scheduler.record(task_index, system_a, system_b, winner)
+
+    # Each response is generated once, even when several comparisons need it at the same time
+    response_locks = {}
+    response_locks_lock = threading.Lock()
+    failed_responses = {}
+
+    def response(task_index, system):
+        with response_locks_lock:
+            lock = response_locks.setdefault((task_index, system), threading.Lock())
+        with lock:
+            if (task_index, system) in failed_responses:
+                raise failed_responses[task_index, system]
+            stage = f"system:{system}"
+            saved = store.get_stage(run_id, task_index, stage)
+            if saved is not None:
+                return saved[0]
+            start_time = time.time()
+            try:
+                with tagged(stage=stage, sink=store.put_call, run_id=run_id, task_index=task_index):
+                    output = SYSTEMS[system](tasks[task_index], api_key, cache_mode)
+            except Exception as e:
+                failed_responses[task_index, system] = e
+                raise
+            store.put_stage(run_id, task_index, stage, output, time.time() - start_time)
+            return output
+
+    def judge(task_index, system_a, system_b):
+        response_a, response_b = response(task_index, system_a), response(task_index, system_b)
+        stage = f"judge:{system_a} vs {system_b}"
+        start_time = time.time()
+        with tagged(stage=stage, sink=store.put_call, run_id=run_id, task_index=task_index):
+            judge_response = run_judge(tasks[task_index], response_a, response_b, api_key, cache_mode,
+                                       judge_mode=judge_mode)
+        store.put_stage(run_id, task_index, stage, judge_response, time.time() - start_time)
+        winner = run_winner(judge_response, system_a, system_b)
+        store.put_comparison(run_id, task_index, system_a, system_b, winner)
+        return winner
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while not scheduler.settled():
+            size = concurrency if budget is None else min(concurrency, budget - len(scheduler.judged))
+            comparisons = scheduler.next_round(size) if size > 0 else []
+            if not comparisons:
+                break
+            pending = {executor.submit(judge, *comparison): comparison for comparison in comparisons}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task_index, system_a, system_b = pending.pop(future)
+                    try:
+                        winner = future.result()
+                    except Exception as e:
+                        scheduler.record(task_index, system_a, system_b)
+                        log.write(f"[{len(scheduler.judged)}] task {task_index}: {system_a} vs {system_b} "
+                                  f"failed: {e}\n")
+                        continue
+                    scheduler.record(task_index, system_a, system_b, winner)
+                    log.write(f"[{len(scheduler.judged)}] task {task_index}: {system_a} vs {system_b}: {winner}\n")
+    return run_id, scheduler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank N systems over a JSONL task file with as few judge calls as possible.")
+    parser.add_argument("tasks", help="JSONL file with one task per line")
+    parser.add_argument("--systems", nargs="+", required=True, choices=sorted(SYSTEMS), metavar="SYSTEM",
+                        help=f"systems to rank, out of: {', '.join(sorted(SYSTEMS))}")
+    parser.add_argument("--concurrency", type=int, default=4, help="comparisons judged in parallel in a round")
+    parser.add_argument("--budget", type=int, help="maximum number of judge calls")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE,
+                        help="share of bootstrap resamples that must agree on the order of every pair of neighbours")
+    parser.add_argument("--min-comparisons", type=int, default=DEFAULT_MIN_COMPARISONS,
+                        help="judgements of every pair of neighbours before the ranking can be settled")
+    parser.add_argument("--cache", choices=[CACHE_USE, CACHE_REFRESH, CACHE_BYPASS], default=CACHE_USE,
+                        help="response cache mode for this run")
+    parser.add_argument("--judge", choices=[JUDGE_VERBOSE, JUDGE_COMPACT], default=JUDGE_COMPACT,
+                        help="compact criterion scores and verdicts through function calling, or verbose explanations")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the scheduler's tie-breaks and the bootstrap")
+    parser.add_argument("--run-id", help="id of the run to create, or of an interrupted tournament to resume")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"),
+                        help="OpenAI API key (defaults to $OPENAI_API_KEY)")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("an OpenAI API key is required (--api-key or $OPENAI_API_KEY)")
+    if len(set(args.systems)) < 2:
+        parser.error("a tournament needs at least two different systems")
+
+    tasks = [task for _, task in read_tasks(args.tasks)]
+    _, scheduler = run_tournament(tasks, list(dict.fromkeys(args.systems)), args.api_key, args.concurrency, args.cache,
+                                  args.judge, args.budget, args.confidence, args.min_comparisons, seed=args.seed)
+    exhaustive = len(tasks) * len(scheduler.systems) * (len(scheduler.systems) - 1)
+    settled = scheduler.settled()
+    print(scheduler.ratings.leaderboard().round(1).to_string(index=False))
+    print(f"{len(scheduler.judged)} judge calls instead of {exhaustive} for every ordered pair on every task; "
+          f"ranking {'settled' if settled else 'not settled'}")
+    return 0 if settled else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
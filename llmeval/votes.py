@@ -0,0 +1,151 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+DEFAULT_VOTES_PATH = os.environ.get("LLMEVAL_VOTES_PATH", os.path.join(".llmeval", "votes.sqlite"))
+
+# What a rater can choose on the human evaluator page
+VOTE_A = "A"
+VOTE_B = "B"
+VOTE_TIE = "tie"
+VOTE_BOTH_BAD = "both_bad"
+# The winner recorded for the choices that don't name a slot
+VOTE_WINNERS = {VOTE_TIE: "Tie", VOTE_BOTH_BAD: "Both bad"}
+
+VOTE_COLUMNS = ["rater", "pair_id", "task", "model_a", "model_b", "choice", "winner", "shown", "voted",
+                "latency_seconds"]
+
+
+class VoteStore:
+    """
+    Append-optimized store for human votes.
+    Votes are queued and written by a background thread in batches of up to batch_size, one transaction
+    per batch, so casting a vote never waits for the disk. Running totals per winner are kept up to date
+    by a trigger, so reading them costs the same at a hundred votes and at a million.
+    """
+
+    def __init__(self, path=DEFAULT_VOTES_PATH, batch_size=500, flush_interval=0.2):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # A commit is durable once it reaches the WAL; syncing every batch would throttle the writer
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS votes (
+                vote_id INTEGER PRIMARY KEY, rater TEXT NOT NULL, pair_id TEXT, task TEXT NOT NULL,
+                model_a TEXT NOT NULL, model_b TEXT NOT NULL, choice TEXT NOT NULL, winner TEXT NOT NULL,
+                shown REAL, voted REAL NOT NULL, latency_seconds REAL);
+            CREATE INDEX IF NOT EXISTS votes_by_rater ON votes (rater);
+            CREATE INDEX IF NOT EXISTS votes_by_pair ON votes (pair_id);
+            CREATE TABLE IF NOT EXISTS vote_totals (
+                winner TEXT PRIMARY KEY, votes INTEGER NOT NULL);
+            CREATE TRIGGER IF NOT EXISTS count_vote AFTER INSERT ON votes BEGIN
+                INSERT INTO vote_totals (winner, votes) VALUES (NEW.winner, 1)
+                ON CONFLICT (winner) DO UPDATE SET votes = votes + 1;
+            END;
+            """
+        )
+        self._writer = threading.Thread(target=self._write_batches, name="llmeval-votes", daemon=True)
+        self._writer.start()
+        # Votes still queued when the process exits are written first
+        atexit.register(self.flush)
+
+    def add_vote(self, rater, pair_id, task, mapping, choice, shown=None):
+        """
+        Queue a vote and return immediately.
+        mapping is the hidden slot mapping shown to the rater ({"A": {"model": ...}, "B": {"model": ...}}),
+        pair_id is None for a custom task, and shown is when the responses appeared, for the decision latency.
+        """
+        voted = time.time()
+        winner = mapping[choice]["model"] if choice in (VOTE_A, VOTE_B) else VOTE_WINNERS[choice]
+        self._queue.put((rater, pair_id, task, mapping["A"]["model"], mapping["B"]["model"], choice, winner, shown,
+                         voted, voted - shown if shown is not None else None))
+
+    def flush(self):
+        """Wait until every queued vote is written."""
+        self._queue.join()
+
+    def _write_batches(self):
+        while True:
+            batch = [self._queue.get()]
+            # Collect what arrives within flush_interval into the same transaction
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                with self._lock:
+                    self._conn.execute("BEGIN")
+                    try:
+                        self._conn.executemany(
+                            f"INSERT INTO votes ({', '.join(VOTE_COLUMNS)}) "
+                            f"VALUES ({', '.join('?' * len(VOTE_COLUMNS))})",
+                            batch,
+                        )
+                        self._conn.execute("COMMIT")
+                    except Exception:
+                        self._conn.execute("ROLLBACK")
+                        raise
+            except Exception as e:
+                self.dropped += len(batch)
+                self.last_error = e
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def totals(self):
+        """Return the number of votes for each winner, including "Tie" and "Both bad"."""
+        return dict(self._execute("SELECT winner, votes FROM vote_totals"))
+
+    def rater_votes(self, rater):
+        """Return the number of votes a rater has cast."""
+        return self._execute("SELECT COUNT(*) FROM votes WHERE rater = ?", (rater,))[0][0]
+
+    def iter_votes(self, after=0):
+        """
+        Yields the votes cast after vote id after as dicts, with their vote_id, in the order they were cast,
+        without loading them all at once.
+        """
+        columns = ["vote_id"] + VOTE_COLUMNS
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT {', '.join(columns)} FROM votes WHERE vote_id > ? ORDER BY vote_id", (after,)
+            )
+            rows = cursor.fetchmany(1024)
+        while rows:
+            for row in rows:
+                yield dict(zip(columns, row))
+            with self._lock:
+                rows = cursor.fetchmany(1024)
+
+
+_vote_store = None
+_vote_store_lock = threading.Lock()
+
+
+def get_vote_store():
+    """Return the process-wide vote store, opening it on first use."""
+    global _vote_store
+    with _vote_store_lock:
+        if _vote_store is None:
+            _vote_store = VoteStore()
+        return _vote_store
@@ -1,9 +1,15 @@
 import streamlit as st
 import random
-import re
-import autogen
-from openai import OpenAI
-from utils import display_response
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from llmeval.cache import CACHE_MODE_LABELS
+from llmeval.pipeline import SPEAKER_MODE_LABELS, run_dragonshield, run_jsa_advisor, warm_up
+from llmeval.pool import get_producer, serve_pair
+from llmeval.ratings import CONFIDENCE, SOURCE_HUMAN, get_rating_engine
+from llmeval.store import get_store
+from llmeval.votes import VOTE_A, VOTE_B, VOTE_BOTH_BAD, VOTE_TIE, get_vote_store
+from utils import display_response, run_with_live_updates
 
 # Page configuration
 st.set_page_config(layout="wide", page_title="Human LLM Response Evaluation", page_icon="👤")
@@ -32,6 +38,32 @@ if "selection_made" not in st.session_state:
     st.session_state.selection_made = False
 if "custom_task_responses" not in st.session_state:
     st.session_state.custom_task_responses = {"A": "", "B": ""}
+if "rater_id" not in st.session_state:
+    st.session_state.rater_id = uuid.uuid4().hex[:8]
+if "current_pair" not in st.session_state:
+    st.session_state.current_pair = None
+
+# Raters are told apart by this id, so the pool never asks anyone to vote on the same pair twice
+rater_id = st.text_input("Your rater name", key="rater_id",
+                         help="Use the same name in every session to continue where you left off")
+
+st.header("Rate Pre-generated Comparisons")
+
+# Pairs generated ahead of time are served instantly, from those the rater hasn't voted on
+pool_size, unseen = get_store().pool_counts(rater_id)
+st.caption(f"{pool_size} comparisons in the pool, {unseen} you haven't voted on yet.")
+if pool_size and not unseen:
+    st.info("You have voted on every comparison in the pool. Enter your own task below.")
+if st.button("Next comparison", disabled=not unseen):
+    # Another session of the same rater may have taken the last unseen pair in the meantime
+    pair = serve_pair(rater_id)
+    if pair is not None:
+        st.session_state.current_pair = pair
+        st.session_state.final_mapping = pair["mapping"]
+        st.session_state.current_question = pair["task"]
+        st.session_state.responses_shuffled = True
+        st.session_state.selection_made = False
+        st.session_state.shown_at = time.time()
 
 st.header("Enter Your Own Task")
 
@@ -43,138 +75,49 @@ api_key = st.text_input("Enter your OpenAI API key", type="password",
 custom_task = st.text_area("Enter your construction task for JSA analysis:", 
                           placeholder="Example: Portable Air Compressor Usage")
 
+# Tasks that were generated before are served from the on-disk response cache
+cache_label = st.selectbox("Response cache", list(CACHE_MODE_LABELS),
+                           help="Refresh calls the models again and overwrites cached responses; bypass neither reads nor writes the cache")
+
+# The fixed speaker flows skip the manager's LLM call for every handover the prompts already determine
+speaker_label = st.selectbox("Dragonshield speaker selection", list(SPEAKER_MODE_LABELS),
+                             help="LLM-selected asks the model to pick every speaker; the fixed flows follow ProjectManager → SafetyInspector → RiskAssessment ⇄ Feedbacker → RiskManagement → Reporter")
+
 # Generate button
 if st.button("Generate Responses") and api_key and custom_task:
+    cache_mode = CACHE_MODE_LABELS[cache_label]
+
+    # Positions are drawn up front, as for a pair from the pool
+    models = ["Dragonshield (Multi-agent)", "JSA Advisor (Single-agent)"]
+    random.shuffle(models)
+
     with st.status("Generating JSA analyses...", expanded=True) as status:
         try:
-            # Initialize OpenAI client
-            client = OpenAI(api_key=api_key)
-            
-            # Setup multi-agent system (Dragonshield)
-            status.update(label="Setting up Dragonshield multi-agent system...")
-            
-            # Common LLM configuration
-            model_config = {"config_list": [{"model": "gpt-4-1106-preview", "temperature": 0.1, "api_key": api_key}]}
-            
-            # Initialize agents for Dragonshield multi-agent system
-            user_proxy = autogen.UserProxyAgent(
-                name="Admin",
-                system_message="A human admin.",
-                code_execution_config=False,
-                human_input_mode="TERMINATE"
-            )
-
-            project_manager_agent = autogen.AssistantAgent(
-                name="ProjectManagerAgent",
-                llm_config=model_config,
-                system_message="""You are a highly skilled construction project manager with expertise in breaking down complex construction tasks into detailed, manageable steps. You excel at understanding the scope of a project and identifying all necessary actions to complete the job efficiently and safely. Your responsibility is to receive the scope and job information from the userproxy, and then meticulously decompose the job into clear, concise steps focusing on the implementation phase (max 5 steps). You will then send these steps to the SafetyInspectorAgent for further analysis. You can only send job steps to SafetyInspectorAgent. Ensure each step is comprehensive and directly related to the job's implementation.""",
-            )
-
-            safety_inspector_agent = autogen.AssistantAgent(
-                name="SafetyInspectorAgent",
-                llm_config=model_config,
-                system_message="""You are a highly experienced safety inspector with a keen eye for identifying potential hazards in construction job processes. Your expertise lies in analyzing detailed job steps and recognizing possible risks that could arise during the implementation phase. Your task is to receive the job steps from the ProjectManagerAgent, meticulously evaluate each step, and identify any potential hazards associated with them. You will then send these identified hazards to the RiskAssessmentAgent. You can only send hazards to the RiskAssessmentAgent. Ensure that all identified hazards are relevant and clearly articulated for effective risk management.""",
-            )
-
-            risk_assessment_agent = autogen.AssistantAgent(
-                name="RiskAssessmentAgent",
-                llm_config=model_config,
-                system_message="""You are a risk assessment specialist with extensive experience in evaluating and quantifying risks in construction projects. Your expertise lies in assessing the likelihood and impact of potential hazards. Your task is to receive the identified hazards from the SafetyInspectorAgent and FeedbackerAgent, analyze each hazard, and provide an assessment of its likelihood and impact based on the below scales. You have to write based on which criteria you choose these scales for each hazard. You will then send these assessments to the FeedbackerAgent.  In case your analyze needs to be fixed, you will receive feedback from the FeedbackerAgent. You'll need to change your scale and rewrite your analysis based on that feedback. Maybe this process of rewriting analyze will happen a few times until the FeedbackerAgent can't provide any more feedback. Never say "TERMINATE".
-
-            Likelihood:
-            - **P6: Almost Certain (>75%)**: The event is expected to occur during the project phase/facility life and has occurred several times on similar projects/facilities.
-            - **P5: Likely (50% to 75%)**: The event has occurred sometime on a similar project or facility.
-            - **P4: Possible (25% to 50%)**: Plausible to occur during the project phase or facility life.
-            - **P3: Unlikely (5% to 25%)**: The event may occur in certain circumstances during the project phase or facility life.
-            - **P2: Rare (1% to 5%)**: The event may occur in exceptional circumstances during the project phase or facility life.
-            - **P1: Unforeseen (<1%)**: The event is not foreseen to occur during the project phase or facility life.
-            Impact:
-            - **C1: Insignificant**: Near hit incident. Low health effects/Recovery within hours.
-            - **C2: Minor**: Minor injury/Medical treatment/Restricted workday case. Medium health effects, recovery in less than 6 days.
-            - **C3: Moderate**: Moderate injury/Limited Lost time/Lost workday Case. Reversible incapacity health effects (Long & short absentee greater than 6 days).
-            - **C4: Significant**: Significant injury/Extended lost time/Hospitalization. Long-term health effects.
-            - **C5: Major**: One fatality or permanent incapacity (Occupational disability).
-            - **C6: Catastrophic**: More than one fatality.
-            """,
-            )
-
-            feedbacker_agent = autogen.AssistantAgent(
-                name="FeedbackerAgent",
-                llm_config=model_config,
-                system_message="""As an experienced construction risk analyst, your role involves overseeing and providing feedback on risk analysis assessments. The RiskAssessmentAgent delivers analyses on the likelihoods and impacts of identified hazards. Your primary responsibility is to ensure the quality and efficiency of these analyses. You are tasked with reviewing these assessments and generating feedback reports on required improvements, without rewriting the analyses yourself. You have to iterate this process with the RiskAssessmentAgent until the RiskAssessmentAgent assessments are completely satisfied. Then, you can forward the identified hazards along with their likelihood and impact assessments to the RiskManagementAgent for further action.""",
-            )
-
-            risk_management_agent = autogen.AssistantAgent(
-                name="RiskManagementAgent",
-                llm_config=model_config,
-                system_message="""You are a highly skilled risk management specialist with extensive experience in developing effective mitigation strategies for construction-related hazards. With your expertise in risk management, analyze the hazards and their assessments provided by the FeedbackerAgent. Develop and document effective mitigation strategies for each significant risk, ensuring these strategies are practical and detailed before forwarding them to the ReporterAgent.""",
-            )
-
-            reporter_agent = autogen.AssistantAgent(
-                name="ReporterAgent",
-                llm_config=model_config,
-                system_message="""You are an expert communicator and report writer with a strong background in construction safety and risk management. Your role is to compile and synthesize information to create comprehensive and clear final reports. Your task is to receive the job steps from the ProjectManagerAgent, the identified hazards and their risk assessments from the FeedbackerAgent, and the preventive measures for high and moderate-risk hazards from the RiskManagementAgent. You will organize this information into a structured table, ensuring that each job step, associated high and moderate-risk hazard, likelihood and impact assessment, and preventive measure is clearly presented. Once the table is complete, you will create a final report summarizing the findings and recommendations. When the JSA process is complete, you will announce 'TERMINATE'. Ensure that the final report is thorough, accurate, and easy to understand.""",
-            )
-            
-            # Setup group chat for Dragonshield
-            groupchat = autogen.GroupChat(
-                agents=[user_proxy, project_manager_agent, safety_inspector_agent, risk_assessment_agent, 
-                        feedbacker_agent, risk_management_agent, reporter_agent], 
-                messages=[], 
-                max_round=10
-            )
-
-            manager = autogen.GroupChatManager(
-                groupchat=groupchat, 
-                llm_config=model_config,
-                system_message="""You are a highly efficient and organized project coordinator with extensive experience in managing collaborative tasks and workflows in the construction sector. Your role is to ensure smooth communication and adherence to risk management protocols among the various AI agents: ProjectManagerAgent, SafetyInspectorAgent, RiskAssessmentAgent, FeedbackerAgent, ProjectManagerAgent, and ReporterAgent. Your task is to oversee the workflow, ensure each agent completes their tasks accurately and on time, and address any issues that arise during the process. You will facilitate the seamless handover of information between agents and ensure that the final output meets the workshop's goals. you have to send assessments from RiskAssessmentAgent to RiskAssessmentFeedbackAgent.""",
-            )
-            
-            # Run the Dragonshield multi-agent system
-            status.update(label="Running Dragonshield multi-agent JSA analysis...")
-            response = user_proxy.initiate_chat(
-                manager,
-                message=custom_task,
-            )
-            
-            # Extract Dragonshield (multi-agent) response
-            dragonshield_response = ""
-            for message in response.chat_history:
-                if message.get('name') == 'ReporterAgent':
-                    dragonshield_response = message.get('content')
-                    break
-            
-            # Generate JSA Advisor (single-agent) response
-            status.update(label="Generating JSA Advisor (single-agent) response...")
-            jsa_advisor_prompt = """You are tasked with conducting a complete Job Safety Analysis (JSA) from start to finish. Here is your workflow: Receive Project Scope: Begin by collecting the scope of the construction project and the specific job/task from the UserProxy. Break down the job/task into detailed implementation steps, focusing on each action needed to complete it efficiently and safely. For each job step, identify potential hazards that could arise during the implementation. Assess the likelihood and impact of each identified hazard using the below information:
-            
-            Likelihood:
-            - **P6: Almost Certain (>75%)**: The event is expected to occur during the project phase/facility life and has occurred several times on similar projects/facilities.
-            - **P5: Likely (50% to 75%)**: The event has occurred sometime on a similar project or facility.
-            - **P4: Possible (25% to 50%)**: Plausible to occur during the project phase or facility life.
-            - **P3: Unlikely (5% to 25%)**: The event may occur in certain circumstances during the project phase or facility life.
-            - **P2: Rare (1% to 5%)**: The event may occur in exceptional circumstances during the project phase or facility life.
-            - **P1: Unforeseen (<1%)**: The event is not foreseen to occur during the project phase or facility life.
-            Impact:
-            - **C1: Insignificant**: Near hit incident. Low health effects/Recovery within hours.
-            - **C2: Minor**: Minor injury/Medical treatment/Restricted workday case. Medium health effects, recovery in less than 6 days.
-            - **C3: Moderate**: Moderate injury/Limited Lost time/Lost workday Case. Reversible incapacity health effects (Long & short absentee greater than 6 days).
-            - **C4: Significant**: Significant injury/Extended lost time/Hospitalization. Long-term health effects.
-            - **C5: Major**: One fatality or permanent incapacity (Occupational disability).
-            - **C6: Catastrophic**: More than one fatality.
-
-            Determine preventive measures for high and moderate-risk hazards. Compile all data into a structured table listing job steps, associated hazards, their assessments, and preventive measures: Job Step, Hazard, Likelihood (P), Impact (C), and Preventive Measures. Create a final comprehensive report summarizing the findings and recommendations. Communication should be formal and technical, providing clear and precise information."""
-            
-            jsa_advisor = client.chat.completions.create(
-                model="gpt-4-1106-preview",
-                messages=[
-                    {"role": "system", "content": jsa_advisor_prompt},
-                    {"role": "user", "content": custom_task}
-                ]
-            )
-            
-            # Get the JSA Advisor response
-            jsa_advisor_response = jsa_advisor.choices[0].message.content
+            live = status.empty()
+            panes = []
+            for slot, column in zip("AB", live.container().columns(2, gap="large")):
+                column.subheader(f"Response {slot}")
+                panes.append(column.empty())
+            started = time.monotonic()
+
+            # Both systems run side by side. Nothing is streamed into the slots: the advisor's tokens would
+            # start at once while Dragonshield's report only arrives at the end of its chat, which would tell
+            # the rater which system is which. Both slots show the same progress until both responses are in.
+            def generate(emit):
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    dragonshield_future = executor.submit(run_dragonshield, custom_task, api_key, cache_mode,
+                                                          speaker_mode=SPEAKER_MODE_LABELS[speaker_label])
+                    jsa_advisor_future = executor.submit(run_jsa_advisor, custom_task, api_key, cache_mode)
+                    return dragonshield_future.result(), jsa_advisor_future.result()
+
+            def flush():
+                for pane in panes:
+                    pane.markdown(f"_Generating... {time.monotonic() - started:.0f}s_")
+
+            dragonshield_response, jsa_advisor_response = run_with_live_updates(generate, lambda event: None, flush)
+            live.empty()
+            if not dragonshield_response:
+                raise RuntimeError("Dragonshield ended without a report. Please generate the responses again.")
             
             # Store responses in session state
             st.session_state.custom_task_responses = {
@@ -188,17 +131,17 @@ if st.button("Generate Responses") and api_key and custom_task:
                 "JSA Advisor (Single-agent)": jsa_advisor_response
             }
             
-            shuffled = list(original_mapping.items())
-            random.shuffle(shuffled)
-            
             st.session_state.response_mapping = {
-                "A": {"response": shuffled[0][1], "model": shuffled[0][0]},
-                "B": {"response": shuffled[1][1], "model": shuffled[1][0]}
+                "A": {"response": original_mapping[models[0]], "model": models[0]},
+                "B": {"response": original_mapping[models[1]], "model": models[1]}
             }
             
             st.session_state.final_mapping = st.session_state.response_mapping.copy()
             st.session_state.responses_shuffled = True
-            st.session_state.current_question = None
+            st.session_state.current_question = custom_task
+            st.session_state.current_pair = None
+            st.session_state.selection_made = False
+            st.session_state.shown_at = time.time()
             
             status.update(label="Responses generated successfully!", state="complete")
             
@@ -208,6 +151,8 @@ if st.button("Generate Responses") and api_key and custom_task:
 # Display responses if available
 if st.session_state.responses_shuffled and st.session_state.final_mapping and st.session_state.final_mapping["A"] and st.session_state.final_mapping["B"]:
     st.subheader("Choose the Better LLM Response")
+    if st.session_state.current_question:
+        st.markdown(f"**Task:** {st.session_state.current_question}")
     with st.form("response_form"):
         col1, col2 = st.columns(2, gap="large")
 
@@ -232,15 +177,69 @@ if st.session_state.responses_shuffled and st.session_state.final_mapping and st
 
         # Display the user selection result and map back to the model
         if not st.session_state.selection_made:
+            choice = None
             if a_better:
-                st.session_state.selection_made = True
+                choice = VOTE_A
                 st.success(f"You selected: A is better (Model: {st.session_state.final_mapping['A']['model']})")
             elif b_better:
-                st.session_state.selection_made = True
+                choice = VOTE_B
                 st.success(f"You selected: B is better (Model: {st.session_state.final_mapping['B']['model']})")
             elif tie:
-                st.session_state.selection_made = True
+                choice = VOTE_TIE
                 st.success("You selected: It's a tie")
             elif both_bad:
+                choice = VOTE_BOTH_BAD
+                st.success("You selected: Both are bad")
+            if choice is not None:
                 st.session_state.selection_made = True
-                st.success("You selected: Both are bad") 
\ No newline at end of file
+                # Queued for the vote store's writer thread, so the page doesn't wait for the disk
+                pair = st.session_state.current_pair
+                get_vote_store().add_vote(rater_id, pair["pair_id"] if pair else None,
+                                          st.session_state.current_question or "", st.session_state.final_mapping,
+                                          choice, st.session_state.get("shown_at"))
+                # A pool pair leaves the rater's queue once they have voted on it, not when it was served
+                if pair:
+                    get_store().mark_pair_voted(rater_id, pair["pair_id"])
+
+st.header("Votes So Far")
+vote_totals = get_vote_store().totals()
+columns = st.columns(4)
+for column, winner in zip(columns, ["Dragonshield (Multi-agent)", "JSA Advisor (Single-agent)", "Tie", "Both bad"]):
+    column.metric(winner, vote_totals.get(winner, 0))
+st.caption(f"You have cast {get_vote_store().rater_votes(rater_id)} votes.")
+
+# Ratings from the votes, updated with only the votes cast since the last rerun
+if any(vote_totals.values()):
+    rating_engine = get_rating_engine()
+    rating_engine.update(vote_store=get_vote_store())
+    human_ratings = rating_engine.leaderboard((SOURCE_HUMAN,))
+    st.caption(f"Bradley–Terry ratings on the Elo scale with {CONFIDENCE:.0%} bootstrap intervals; ties and "
+               "\"both bad\" votes count as half a win each")
+    st.dataframe(human_ratings.drop(columns="Source").round(1), use_container_width=True, hide_index=True)
+
+st.header("Comparison Pool")
+with st.expander("Fill the pool from a task list"):
+    # The producer runs in the background for the whole server, not just this session
+    producer = get_producer()
+    pool_tasks = st.text_area("Tasks, one per line", placeholder="Portable Air Compressor Usage\nScaffold erection")
+    pool_concurrency = st.number_input("Pairs generated in parallel", min_value=1, max_value=16, value=2)
+    st.caption("Uses the API key, response cache and speaker selection above. Tasks that already have a pair are skipped.")
+    col_start, col_stop = st.columns(2)
+    with col_start:
+        if st.button("Start filling", disabled=producer.running or not api_key):
+            tasks = list(dict.fromkeys(line.strip() for line in pool_tasks.splitlines() if line.strip()))
+            producer.start(tasks, api_key, int(pool_concurrency), CACHE_MODE_LABELS[cache_label],
+                           SPEAKER_MODE_LABELS[speaker_label])
+    with col_stop:
+        if st.button("Stop after the current pairs", disabled=not producer.running):
+            producer.stop()
+    progress = producer.progress
+    if progress["started"] is not None:
+        state = "running" if producer.running else "finished"
+        st.write(f"Fill {state}: {progress['generated']} pairs added and {progress['failed']} failed "
+                 f"from a list of {progress['total']} tasks; tasks already in the pool are skipped.")
+        if progress["last_error"]:
+            st.warning(f"Last error: {progress['last_error']}")
+
+# The page renders without autogen, openai and pandas; load them while the rater reads the responses
+warm_up()
@@ -1,28 +1,133 @@
-import pandas as pd
-import re
-import streamlit as st
-from io import StringIO
-
-@st.cache_data
-def extract_tables(markdown_text):
-    """
-    Extracts tables from Markdown text and returns them as a list of DataFrames.
-    """
-    tables = []
-    pattern = re.compile(r'(\|.+?\|(?:\n\|[-:]+)+\n(?:\|.*?\|(?:\n|$))+)', re.DOTALL)
-    matches = pattern.findall(markdown_text)
-    for match in matches:
-        table = pd.read_csv(StringIO(match), sep='|').dropna(axis=1, how='all').dropna(axis=0, how='all')
-        tables.append(table)
-    return tables
-
-def display_response(response_text):
-    """
-    Displays the response text, rendering Markdown and tables appropriately.
-    """
-    tables = extract_tables(response_text)
-    for table in tables:
-        st.table(table)
-        response_text = response_text.replace(table.to_markdown(), '')
-
-    st.markdown(response_text)
+import queue
+import re
+import streamlit as st
+import threading
+import time
+from llmeval.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+TABLE_DELIMITER_CHARS = set("|-: \t\r")
+UNESCAPED_PIPE = re.compile(r'(?<!\\)\|')
+
+def _table_cells(line):
+    """
+    Splits a Markdown table row into its cell values.
+    """
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|') and not line.endswith('\\|'):
+        line = line[:-1]
+    return [cell.strip().replace('\\|', '|') for cell in UNESCAPED_PIPE.split(line)]
+
+def _is_table_row(line):
+    return line.lstrip().startswith('|')
+
+def _is_delimiter_row(line):
+    return _is_table_row(line) and '-' in line and set(line) <= TABLE_DELIMITER_CHARS
+
+def _table_frame(header, rows):
+    """
+    Builds a DataFrame from a header row and body rows, padding or cutting rows to the header width.
+    """
+    columns = []
+    seen = {}
+    for name in header:
+        # Repeated column names get a suffix, as pd.read_csv would give them
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        columns.append(f"{name}.{count}" if count else name)
+    width = len(columns)
+    body = [(row + [''] * width)[:width] for row in rows]
+    return pd.DataFrame(body, columns=columns)
+
+def parse_markdown_segments(markdown_text):
+    """
+    Splits Markdown text into ordered ("text", str) and ("table", DataFrame) segments in one pass over its lines.
+    """
+    segments = []
+    lines = markdown_text.split('\n')
+    text_start = 0
+    i = 0
+    while i < len(lines):
+        # A table is a header row, a delimiter row and any number of body rows
+        if i + 1 < len(lines) and _is_table_row(lines[i]) and _is_delimiter_row(lines[i + 1]):
+            if i > text_start:
+                segments.append(("text", '\n'.join(lines[text_start:i])))
+            header = _table_cells(lines[i])
+            i += 2
+            rows = []
+            while i < len(lines) and _is_table_row(lines[i]):
+                rows.append(_table_cells(lines[i]))
+                i += 1
+            segments.append(("table", _table_frame(header, rows)))
+            text_start = i
+        else:
+            i += 1
+    if text_start < len(lines):
+        segments.append(("text", '\n'.join(lines[text_start:])))
+    return segments
+
+@st.cache_data(max_entries=256)
+def extract_segments(markdown_text):
+    """
+    Returns the text and table segments of a response, memoized by its content across reruns.
+    """
+    return parse_markdown_segments(markdown_text)
+
+def extract_tables(markdown_text):
+    """
+    Extracts tables from Markdown text and returns them as a list of DataFrames.
+    """
+    return [value for kind, value in extract_segments(markdown_text) if kind == "table"]
+
+def display_response(response_text):
+    """
+    Displays the response text, rendering Markdown and tables appropriately.
+    """
+    # Text and tables are rendered in their original order, each exactly once
+    for kind, value in extract_segments(response_text):
+        if kind == "table":
+            st.table(value)
+        elif value.strip():
+            st.markdown(value)
+
+def run_with_live_updates(work, on_event, flush=None, interval=0.1):
+    """
+    Runs work(emit) in a background thread and passes every event it emits to on_event on the script thread,
+    where Streamlit elements can be updated. flush is called at most every interval seconds, so placeholders
+    are redrawn a few times a second rather than once per token. Returns what work returns.
+    """
+    events = queue.Queue()
+    done = object()
+    outcome = {}
+
+    def target():
+        try:
+            outcome["value"] = work(events.put)
+        except Exception as e:
+            outcome["error"] = e
+        finally:
+            events.put(done)
+
+    threading.Thread(target=target, daemon=True).start()
+    last_flush = 0.0
+    while True:
+        try:
+            event = events.get(timeout=interval)
+        except queue.Empty:
+            event = None
+        if event is done:
+            break
+        if event is not None:
+            on_event(event)
+        if flush is not None and time.monotonic() - last_flush >= interval:
+            flush()
+            last_flush = time.monotonic()
+
+    if flush is not None:
+        flush()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("value")